@@ -6,7 +6,10 @@ Main application with interactive mode and CLI arguments
 import sys
 import os
 import time
+import random
 import argparse
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from colorama import Fore, Style, init
 
@@ -14,12 +17,29 @@ from colorama import Fore, Style, init
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from xray_manager import XrayManager
+from xray_api import XrayAPIError
 from ip_generator import IPGenerator
+from ip_set import IPSet
+from scan_order import ScanOrder
+from subnet_scheduler import AdaptiveSubnetScheduler
 from config_generator import XrayConfigGenerator
 from connection_tester import ConnectionTester
+from adaptive_timeout import AdaptiveTimeout
+from early_stop import EarlyStop, parse_duration
+from concurrency_governor import ConcurrencyGovernor
+from scan_journal import ScanJournal
+from result_stream import iter_results
+from results_db import ResultsDB
+from incremental_scan import IncrementalScan
+from priority_scheduler import HistoryPriorityScheduler
+from batch_runner import PipelinedBatchRunner
+from port_allocator import PortAllocator
+from prefilter import Prefilter
 from reporter import Reporter
 from url_parser import URLParser
-from domain_resolver import resolve_domain_to_cloudflare_ips
+from domain_resolver import (
+    resolve_domain_to_cloudflare_ips, resolve_many, load_domains, configure_dns_cache
+)
 
 init(autoreset=True)
 
@@ -76,7 +96,7 @@ def select_test_mode():
     print(f"{Fore.GREEN}2.{Fore.WHITE} Custom Range (e.g. 104.16.0.0/24)")
     print(f"{Fore.GREEN}3.{Fore.WHITE} Domain Scan (Find IPs for specific domain)")
     print(f"{Fore.GREEN}4.{Fore.WHITE} Load from File (cloudflare-ips.txt)")
-    print(f"{Fore.GREEN}5.{Fore.WHITE} ALL Ranges (Hours!)")
+    print(f"{Fore.GREEN}5.{Fore.WHITE} ALL Ranges (Hours! Or minutes when sampled per subnet)")
     print(f"{Fore.GREEN}6.{Fore.WHITE} LINE/NAVER Ranges (Special)")
     
     choice = get_input("\nSelect mode [1-6]", "1", ["1", "2", "3", "4", "5", "6"])
@@ -153,6 +173,25 @@ def select_test_mode():
 
 
 
+def configure_sampling():
+    """Configure stratified per-subnet sampling for full-range scans"""
+    print(f"\n{Fore.YELLOW}Sampling tests a few random IPs from every subnet instead of")
+    print(f"{Fore.YELLOW}every address - minutes instead of hours, still covering each prefix.")
+    
+    if not get_yes_no("Sample IPs per subnet?", "y"):
+        return None, 24
+    
+    try:
+        per_subnet = int(get_input("IPs per subnet", "1"))
+        prefix_len = int(get_input("Subnet prefix length", "24"))
+        if per_subnet < 1 or not 0 < prefix_len <= 32:
+            raise ValueError
+        return per_subnet, prefix_len
+    except ValueError:
+        print(f"{Fore.RED}Invalid numbers. Using 1 IP per /24.")
+        return 1, 24
+
+
 def configure_server():
     """Configure server settings"""
     print(f"\n{Fore.YELLOW}{'='*70}")
@@ -263,6 +302,9 @@ def confirm_and_run(config):
     print(f"{Fore.WHITE}Bug/SNI Mode: {Fore.GREEN}{config['zoom_style']}")
     print(f"{Fore.WHITE}Timeout: {Fore.GREEN}{config['timeout']}s")
     print(f"{Fore.WHITE}Batch Size: {Fore.GREEN}{config['concurrent']}")
+    if config.get('samples', 1) > 1 or config.get('warmup'):
+        warmup = " + warm-up" if config.get('warmup') else ""
+        print(f"{Fore.WHITE}Samples per IP: {Fore.GREEN}{config.get('samples', 1)}{warmup}")
     
     print(f"\n{Fore.YELLOW}Estimated time: ~{config['estimated_time']} minutes")
     
@@ -277,8 +319,12 @@ def confirm_and_run(config):
     return True
 
 
-def run_test(config):
-    """Execute the test"""
+def run_test(config, journal=None):
+    """
+    Execute the test
+    Every finished batch is checkpointed to a ScanJournal; pass the loaded
+    journal of an interrupted run to continue it.
+    """
     # clear_screen()
     print(f"\n{Fore.CYAN}{'='*70}")
     print(f"{Fore.CYAN}STARTING TEST...")
@@ -296,22 +342,125 @@ def run_test(config):
     # Step 2: Generate IPs
     print(f"{Fore.YELLOW}[2/4] Generating IP list...")
     try:
-        if config.get('use_line_ranges'):
-            line_ranges = IPGenerator.get_line_ranges()
-            all_ips = []
-            for ip_range in line_ranges:
-                all_ips.extend(IPGenerator.parse_range(ip_range))
-            ip_list = all_ips    
+        if journal:
+            # Exactly the addresses of the interrupted run
+            ip_sources = journal.ip_sources
+        elif config.get('use_line_ranges'):
+            ip_sources = IPGenerator.get_line_ranges()
         elif config['use_cloudflare_ranges']:
-            cf_ranges = IPGenerator.get_cloudflare_ranges()
-            all_ips = []
-            for ip_range in cf_ranges:
-                all_ips.extend(IPGenerator.parse_range(ip_range))
-            ip_list = all_ips
+            ip_sources = IPGenerator.get_cloudflare_ranges()
         else:
-            ip_list = IPGenerator.parse_range(config['ip_range'])
+            ip_sources = config.get('ip_sources') or [config['ip_range']]
+        
+        # Merge overlapping sources into a compact set; IPs are generated
+        # lazily from it while testing
+        ip_set = IPGenerator.build_ip_set(ip_sources)
+        total_ips = ip_set.count()
+        scan_order = ScanOrder(ip_set, config.get('scan_order', 'sequential'), config.get('seed'))
+        samples = None
         
-        print(f"{Fore.GREEN}✓ Generated {len(ip_list):,} IPs\n")
+        print(f"{Fore.GREEN}✓ Generated {total_ips:,} unique IPs "
+              f"({ip_set.interval_count():,} ranges)")
+        
+        sample_prefix = None
+        scheduler = None
+        if config.get('adaptive_budget'):
+            # Explore every subnet, then concentrate on the ones that work
+            sample_prefix = config.get('sample_prefix', 24)
+            scheduler = AdaptiveSubnetScheduler(
+                ip_set,
+                budget=config['adaptive_budget'],
+                prefix_len=sample_prefix,
+                explore_per_subnet=config.get('sample_per_subnet') or 2,
+                seed=scan_order.seed
+            )
+            total_ips = scheduler.total()
+            print(f"{Fore.CYAN}  Adaptive: {len(scheduler.subnets):,} /{sample_prefix} subnets, "
+                  f"budget {total_ips:,} probes")
+        elif config.get('sample_per_subnet'):
+            # Stratified sample: K IPs per subnet instead of every address
+            sample_prefix = config.get('sample_prefix', 24)
+            samples = [ip for ip, _ in IPGenerator.sample_subnets(
+                ip_set, config['sample_per_subnet'], sample_prefix, seed=scan_order.seed)]
+            if scan_order.order == 'random':
+                random.Random(scan_order.seed).shuffle(samples)
+            subnet_count, total_ips = IPGenerator.count_subnet_samples(
+                ip_set, config['sample_per_subnet'], sample_prefix)
+            print(f"{Fore.CYAN}  Sampling {config['sample_per_subnet']} IP(s) per /{sample_prefix}: "
+                  f"{total_ips:,} IPs across {subnet_count:,} subnets")
+        
+        if scan_order.order == 'random':
+            print(f"{Fore.CYAN}  Scan order: random (seed {scan_order.seed}, "
+                  f"re-run with --order random --seed {scan_order.seed})")
+        
+        # Every probe also lands in the results DB for --best-ips / --subnet-latency
+        results_db = None
+        if config.get('results_db', True):
+            results_db = ResultsDB(Path("results") / "results.db")
+        
+        # History of this server and bug host: --incremental skips IPs that
+        # failed within the TTL, --priority tests the likely-good IPs first
+        incremental = None
+        priority = None
+        if config.get('incremental') or config.get('priority'):
+            if scheduler:
+                print(f"{Fore.YELLOW}⚠ --incremental/--priority are not used with --adaptive")
+            elif not results_db:
+                print(f"{Fore.YELLOW}⚠ --incremental/--priority need the results DB, using the normal order")
+            else:
+                # Fixed window end, saved with the run so --resume gets the same order
+                config.setdefault('history_as_of', time.time())
+                server, bug_host = ResultsDB.run_target(config)
+                # Only IPs this run would test count (the sample, if sampling)
+                candidates = IPSet.from_ips(samples) if samples is not None else ip_set
+                
+                if config.get('priority'):
+                    window = config.get('history_window', 7 * 86400)
+                    priority = HistoryPriorityScheduler.from_db(results_db, server, bug_host,
+                                                                window=window,
+                                                                as_of=config['history_as_of'])
+                    print(f"{Fore.CYAN}  Priority: ordering by the last {window / 3600:g}h of history "
+                          f"({len(priority.ip_history):,} IPs, {len(priority.subnet_history):,} /24s)")
+                
+                if config.get('incremental'):
+                    incremental = IncrementalScan.from_db(results_db, candidates, server, bug_host,
+                                                          ttl=config['incremental'],
+                                                          as_of=config['history_as_of'])
+                    total_ips = incremental.total(total_ips)
+                    print(f"{Fore.CYAN}  Incremental: skipping {len(incremental.failed):,} IPs that failed "
+                          f"in the last {config['incremental'] / 3600:g}h, re-testing "
+                          f"{len(incremental.fresh_ok):,} recent working IPs first ({total_ips:,} to test)")
+        
+        # Checkpoint journal; a resumed run continues from its cursor and
+        # skips IPs it already has results for
+        if journal is None:
+            journal = ScanJournal.create()
+            journal.start(config, ip_set, scan_order.seed)
+        elif journal.tested:
+            print(f"{Fore.CYAN}  Resuming: {journal.tested:,} IPs already tested")
+        
+        if results_db:
+            db_run = results_db.start_run(journal.run_id, config)
+        
+        if scheduler:
+            scheduler.restore(journal.iter_results())
+            ip_iter = None
+        else:
+            if samples is not None:
+                base_order = lambda start: iter(samples[start:])
+            else:
+                base_order = scan_order.iter_ips
+            if priority:
+                scan_base = base_order
+                base_order = lambda start: islice(priority.iter_ips(candidates, scan_base(0)), start, None)
+            if incremental:
+                ordered = incremental.iter_ips(base_order, journal.cursor)
+            else:
+                ordered = base_order(journal.cursor)
+            ip_iter = journal.track(ordered, journal.cursor)
+        
+        print(f"{Fore.CYAN}  Run ID: {journal.run_id} (continue if interrupted: --resume {journal.run_id})")
+        print()
     except Exception as e:
         print(f"{Fore.RED}Error: {e}")
         return False
@@ -320,88 +469,285 @@ def run_test(config):
     print(f"{Fore.YELLOW}[3/4] Testing connections (Batch Mode)...")
     
     config_generator = XrayConfigGenerator()
-    tester = ConnectionTester(xray_path=xray_path, timeout=config['timeout'])
+    
+    # Deadline follows the observed success latency; --timeout stays the upper bound
+    adaptive_timeout = None
+    if config.get('adaptive_timeout'):
+        adaptive_timeout = AdaptiveTimeout(
+            maximum=config['timeout'],
+            minimum=min(config.get('min_timeout', 1.0), config['timeout']),
+            quantile=config.get('timeout_quantile', 0.99),
+            factor=config.get('timeout_factor', 3.0)
+        )
+    
+    tester = ConnectionTester(xray_path=xray_path, timeout=config['timeout'],
+                              backend=config.get('probe_backend', 'requests'),
+                              samples=config.get('samples', 1),
+                              warmup=config.get('warmup', False),
+                              adaptive_timeout=adaptive_timeout)
+    # Probe threads are capped apart from the batch size (requests backend)
+    tester.max_workers = config.get('max_threads', tester.max_workers)
     reporter = Reporter()
     
     batch_size = config['concurrent']
-    total_ips = len(ip_list)
-    results = []
+    
+    # Every result is streamed to disk as it arrives; only successes stay
+    # in memory (top list, ranking)
+    result_stream = reporter.open_result_stream(journal.run_id, compress=config.get('compress_results', False))
+    result_stream.write_many(journal.iter_results())
+    successful = list(journal.successes)
+    tested = journal.tested
+    
+    # AIMD batch size: grows while batches are healthy, halves on timeout spikes
+    governor = None
+    if config.get('governor'):
+        maximum = config.get('max_concurrent')
+        if tester.backend == 'requests':
+            # Past the thread cap a bigger batch only queues probes, so the
+            # governor could no longer change how many are in flight
+            if maximum and maximum > tester.max_workers:
+                print(f"{Fore.YELLOW}⚠ --max-concurrent {maximum} is above --max-threads "
+                      f"{tester.max_workers}, capping the batch size at {tester.max_workers}")
+            maximum = min(maximum or tester.max_workers, tester.max_workers)
+        maximum = maximum or 200
+        governor = ConcurrencyGovernor(
+            initial=batch_size,
+            minimum=min(config.get('min_concurrent', 5), maximum),
+            maximum=maximum,
+            log_path=reporter.output_dir / f"governor_{journal.run_id}.jsonl"
+        )
+        batch_size = governor.current
+    
+    # One long-lived Xray reconfigured per batch instead of one process per batch
+    # Free local port blocks for batch inbounds (and the Xray API)
+    port_allocator = PortAllocator()
+    
+    persistent_xray = None
+    api_port_block = None
+    if config.get('persistent_xray') and config['server_config']:
+        api_port_block = port_allocator.reserve(1)
+        try:
+            persistent_xray = xray_manager.start_persistent(api_port=api_port_block.start)
+        except XrayAPIError as e:
+            print(f"{Fore.YELLOW}⚠ Persistent Xray unavailable ({e}), starting Xray per batch")
+            api_port_block.release()
+            api_port_block = None
+    
+    # The adaptive scheduler plans rounds from recorded results, so its
+    # batches must not be read ahead
+    pipeline_depth = 2 if config.get('pipeline') else 1
+    if pipeline_depth > 1 and scheduler:
+        print(f"{Fore.YELLOW}⚠ --pipeline is ignored with --adaptive")
+        pipeline_depth = 1
     
     pbar = reporter.create_progress_bar(total_ips, "Testing IPs")
+    pbar.update(tested)
     
     def progress_callback(completed, total, result):
+        nonlocal tested
+        if prefilter:
+            # Direct TCP/TLS timings of survivors
+            result.update(prefilter.pop_timings(result['ip']))
+        if sample_prefix:
+            # Record which subnet this sample stands for
+            result['subnet'] = IPGenerator.subnet_of(result['ip'], sample_prefix)
+        postfix = {}
+        if result.get('xray_startup_ms') is not None:
+            postfix['startup'] = f"{result['xray_startup_ms']:.0f}ms"
+        if adaptive_timeout:
+            postfix['timeout'] = f"{tester.probe_timeout():.1f}s"
+        if postfix:
+            pbar.set_postfix(postfix, refresh=False)
         pbar.update(1)
         
+        tested += 1
+        result_stream.write(result)
+        if result['status'] == 'success':
+            successful.append(result)
+        
     start_time = time.time()
     
+    # Stop once enough good IPs are found or the time budget is spent.
+    # Only this session's results count, so --resume of a run that stopped
+    # early goes on to test the rest instead of stopping right away
+    early_stop = EarlyStop(
+        success_target=config.get('stop_after_success'),
+        latency_ms=config.get('stop_below_latency'),
+        budget_s=config.get('budget'),
+        default_target=config['top_ips']
+    )
+    stop_reason = None
+    
     # Chunk IPs for batch processing
     # If using real server and zoom style, efficient batching is possible
     # If using 'multi_domain', handled differently? 
     # For now assuming single domain testing for batch optimization
     
-    # Split IPs into chunks
-    chunks = [ip_list[i:i + batch_size] for i in range(0, len(ip_list), batch_size)]
+    # Split IPs into chunks as they are generated
+    if scheduler:
+        chunks = scheduler.batches(batch_size)
+    else:
+        chunks = IPGenerator.iter_chunks(ip_iter, batch_size)
     
-    for chunk_idx, chunk in enumerate(chunks):
-        if config['server_config']:
-            if config['zoom_style']:
-                 # Batch config with Zoom/Bug Style
-                 xray_config = config_generator.generate_batch_config(
-                     chunk, 
-                     config['server_config'],
-                     dns_domain=config['dns_domain'],
-                     use_domain_in_address=config['use_domain_address'],
-                     base_port=20000
-                 )
-            else:
-                 # TODO: Add batch support for Direct/Real server without Zoom Style?
-                 # For now, fallback to single-IP style if not Zoom Style? 
-                 # Or just use the same batch generator but ignore dns_domain?
-                 # Actually generate_batch_config supports generic server config.
-                 xray_config = config_generator.generate_batch_config(
-                     chunk,
-                     config['server_config'],
-                     dns_domain="cloudflare.com", # Irrelevant for non-zoom?
-                     use_domain_in_address=False, # Direct IP
-                     base_port=20000
-                 )
-        else:
-             # Fake server / Direct mode - not supported in batch yet? 
-             # For now, let's assume server_config is present or we handle it efficiently
-             # If no server_config, we can't use generate_batch_config easily because it needs protocol info.
-             # Fallback?
-             pass
-        
-        # Run batch
-        if config['server_config']:
-            batch_results = tester.test_batch_config(
-                xray_config, 
+    def make_config(chunk, base_port):
+        if config['zoom_style']:
+            # Batch config with Zoom/Bug Style
+            return config_generator.generate_batch_config(
                 chunk, 
-                base_port=20000,
-                progress_callback=progress_callback
+                config['server_config'],
+                dns_domain=config['dns_domain'],
+                use_domain_in_address=config['use_domain_address'],
+                base_port=base_port,
+                multiplex=config.get('multiplex', False)
             )
-            results.extend(batch_results)
-        else:
-            # Fallback for no-server-config (Fake/Direct test) - unlikely use case for this tool
-            # But let's handle it for completeness or error out
-            pass
-
+        # generate_batch_config supports generic server config too
+        return config_generator.generate_batch_config(
+            chunk,
+            config['server_config'],
+            dns_domain="cloudflare.com", # Irrelevant for non-zoom
+            use_domain_in_address=False, # Direct IP
+            base_port=base_port,
+            multiplex=config.get('multiplex', False)
+        )
+    
+    def checkpoint(batch_results):
+        journal.record(batch_results)
+        if results_db:
+            results_db.add_results(db_run, batch_results)
+        if scheduler:
+            scheduler.record(batch_results)
+    
+    def record_dead(dead_results):
+        # IPs the prefilter dropped count as tested and failed
+        nonlocal stop_reason
+        for result in dead_results:
+            progress_callback(1, len(dead_results), result)
+        checkpoint(dead_results)
+        # Long runs of dead IPs never reach the batch loop, so the
+        # budget is checked here as well
+        stop_reason = stop_reason or early_stop.should_stop()
+    
+    def until_stopped(chunks):
+        for chunk in chunks:
+            if stop_reason:
+                return
+            yield chunk
+    
+    prefilter = None
+    if config.get('prefilter', 'off') != 'off' and config['server_config']:
+        server = config['server_config']
+        mode = config['prefilter']
+        if mode == 'tls' and server.get('security') != 'tls':
+            print(f"{Fore.YELLOW}⚠ Server does not use TLS, prefiltering with TCP only")
+            mode = 'tcp'
+        prefilter = Prefilter(
+            port=int(server['port']),
+            mode=mode,
+            sni=server.get('sni') or server['address'],
+            timeout=config.get('prefilter_timeout', 1.5),
+            concurrency=config.get('prefilter_concurrency', 1000)
+        )
+        # The adaptive scheduler plans from results, so filter one batch at a time
+        chunks = until_stopped(prefilter.filter_chunks(until_stopped(chunks), batch_size,
+                                                       window=1 if scheduler else None,
+                                                       on_dead=record_dead))
+    
+    # Fake server / Direct mode needs protocol info for batch configs,
+    # so nothing is tested without a server config
+    try:
+        if config['server_config']:
+            # Pipelining starts the next batch's Xray while this one probes
+            runner = PipelinedBatchRunner(
+                tester,
+                make_config,
+                port_allocator=port_allocator,
+                depth=pipeline_depth,
+                xray=persistent_xray,
+                multiplex=config.get('multiplex', False)
+            )
+            batches = runner.run(chunks, progress_callback)
+            try:
+                for chunk, batch_results in batches:
+                    checkpoint(batch_results)
+                    
+                    if governor:
+                        governor.observe(batch_results)
+                    
+                    early_stop.record(batch_results)
+                    stop_reason = stop_reason or early_stop.should_stop()
+                    if stop_reason:
+                        break
+            finally:
+                # Tears down batches started ahead (pipelining) before reporting
+                batches.close()
+                if persistent_xray:
+                    persistent_xray.stop()
+                if api_port_block:
+                    api_port_block.release()
+    finally:
+        journal.close()
+        result_stream.close()
+        if results_db:
+            results_db.close()
+    
+    # Without a server config nothing was tested, so the run is not finished
+    if stop_reason is None and config['server_config']:
+        journal.finish()
+    
     elapsed_time = time.time() - start_time
     pbar.close()
     
+    if stop_reason:
+        print(f"\n{Fore.YELLOW}Stopped early: {stop_reason} "
+              f"({tested:,} of {total_ips:,} IPs tested; "
+              f"--resume {journal.run_id} continues the scan)")
+    
+    if adaptive_timeout and adaptive_timeout.quantile_ms() is not None:
+        print(f"\n{Fore.CYAN}Adaptive timeout: {tester.probe_timeout():.2f}s "
+              f"(p{adaptive_timeout.estimator.p * 100:g} of successes "
+              f"{adaptive_timeout.quantile_ms():.0f}ms x {adaptive_timeout.factor:g})")
+    
+    if persistent_xray and persistent_xray.install_ms:
+        installs = persistent_xray.install_ms
+        removals = persistent_xray.remove_ms
+        print(f"\n{Fore.CYAN}Xray API: {len(installs)} batches, {persistent_xray.api.calls} calls; "
+              f"install avg {sum(installs) / len(installs):.0f}ms"
+              + (f", removal avg {sum(removals) / len(removals):.0f}ms" if removals else ""))
+    
+    if governor and governor.decisions:
+        sizes = [d['size'] for d in governor.decisions]
+        backoffs = sum(1 for d in governor.decisions if d['action'] == 'decrease')
+        print(f"\n{Fore.CYAN}Concurrency governor: batch size {min(sizes)}-{max(sizes)}, "
+              f"next {governor.current()}, {backoffs} backoff(s); decisions in {governor.log_path}")
+    
+    if prefilter:
+        print(f"\n{Fore.CYAN}Prefilter ({prefilter.mode}): {prefilter.passed:,}/{prefilter.checked:,} "
+              f"IPs passed to Xray")
+    
+    if scheduler:
+        best_subnets = scheduler.summary()[:5]
+        if best_subnets:
+            print(f"\n{Fore.CYAN}Best subnets:")
+            for stats in best_subnets:
+                print(f"  {stats.subnet:18s} {stats.successes}/{len(stats.tested)} working")
+    
     print(f"\n{Fore.GREEN}✓ Testing completed in {elapsed_time:.1f}s\n")
     
     # Step 5: Generate reports
     print(f"{Fore.YELLOW}[4/4] Generating reports...")
-    stats = ConnectionTester.get_statistics(results)
+    # Reports read the stream back instead of holding every result
+    result_stream.close()
+    stats = ConnectionTester.get_statistics(iter_results(result_stream.path),
+                                            batch_startups=tester.batch_startups)
     
-    reporter.print_summary(results, stats)
-    reporter.print_top_ips(results, top_n=config['top_ips'])
+    reporter.print_summary(successful, stats)
+    rank_by = config.get('rank_by', 'latency')
+    reporter.print_top_ips(successful, top_n=config['top_ips'], rank_by=rank_by)
     
-    reporter.save_json(results)
+    print(f"{Fore.CYAN}Results saved to: {Fore.WHITE}{result_stream.path}")
     # reporter.save_csv(results) # Disabled by user request
-    reporter.save_working_ips(results)
-    reporter.generate_full_report(results, stats, config)
+    reporter.save_working_ips(result_stream.path, rank_by=rank_by)
+    reporter.generate_full_report(result_stream.path, stats, config)
     
     print(f"\n{Fore.GREEN}{Style.BRIGHT}✓ All done!")
     print(f"{Fore.CYAN}Check results folder for detailed reports.\n")
@@ -409,24 +755,211 @@ def run_test(config):
     return stats['successful'] > 0
 
 
+def resolve_domain_list(spec):
+    """Resolve a domain list concurrently and return the unique Cloudflare IPs"""
+    try:
+        domains = load_domains(spec)
+    except ValueError as e:
+        print(f"{Fore.RED}Error: {e}")
+        return []
+    
+    print(f"{Fore.CYAN}Resolving {len(domains)} domain(s)...")
+    start_time = time.time()
+    answers = resolve_many(domains)
+    
+    cf_ips = []
+    for answer in answers:
+        source = answer['source']
+        if answer['cf_ips']:
+            color = Fore.GREEN
+        elif answer['ips']:
+            color = Fore.YELLOW
+        else:
+            color = Fore.RED
+        print(f"{color}  {answer['domain']:40s} {len(answer['cf_ips']):3d} CF / {len(answer['ips']):3d} IPs"
+              f"  {answer['elapsed_ms']:8.1f}ms ({source})")
+        cf_ips.extend(answer['cf_ips'])
+    
+    cf_ips = list(dict.fromkeys(cf_ips))
+    print(f"{Fore.GREEN}✓ {len(cf_ips)} unique Cloudflare IP(s) from {len(answers)} domain(s) "
+          f"in {time.time() - start_time:.1f}s\n")
+    return cf_ips
+
+
+def print_dns_history(dns_cache, domain):
+    """Print how a domain's IPs changed over time according to the DNS cache"""
+    if not dns_cache:
+        print(f"{Fore.RED}DNS cache is disabled.")
+        return 1
+    
+    history = dns_cache.history(domain)
+    if not history:
+        print(f"{Fore.YELLOW}No cached answers for {domain}")
+        return 1
+    
+    print(f"{Fore.CYAN}DNS history for {domain}:")
+    for entry in history:
+        first_seen = datetime.fromtimestamp(entry['first_seen']).strftime('%Y-%m-%d %H:%M')
+        last_seen = datetime.fromtimestamp(entry['last_seen']).strftime('%Y-%m-%d %H:%M')
+        print(f"  {entry['ip']:15s} first {first_seen}  last {last_seen}  ttl {entry['ttl']}s")
+    return 0
+
+
+def print_best_ips(results_db, server, bug_host, since_s, limit):
+    """Print the IPs with the lowest median latency for a server and bug host from the results DB"""
+    rows = results_db.best_ips(server, bug_host, time.time() - since_s, limit)
+    target = f"{server}, {bug_host or 'direct runs (no --bug)'}"
+    if not rows:
+        print(f"{Fore.YELLOW}No working IPs for {target} in the last {since_s / 3600:g}h")
+        return 1
+    
+    print(f"{Fore.CYAN}Best IPs for {target}, last {since_s / 3600:g}h:")
+    for row in rows:
+        last_seen = datetime.fromtimestamp(row['last_seen']).strftime('%Y-%m-%d %H:%M')
+        print(f"  {row['ip']:15s} median {row['median_ms']:8.1f}ms  min {row['min_ms']:8.1f}ms  "
+              f"{row['successes']}/{row['probes']} ok  last {last_seen}")
+    return 0
+
+
+def print_subnet_latency(results_db, server, bug_host, since_s, limit):
+    """Print median success latency per /24 for a server from the results DB"""
+    rows = results_db.subnet_latency(server, time.time() - since_s, bug_host, limit)
+    if not rows:
+        print(f"{Fore.YELLOW}No working IPs for {server} in the last {since_s / 3600:g}h")
+        return 1
+    
+    print(f"{Fore.CYAN}Median latency per /24 for {server}{', ' + bug_host if bug_host else ''}, "
+          f"last {since_s / 3600:g}h:")
+    for row in rows:
+        print(f"  {row['subnet']:18s} median {row['median_ms']:8.1f}ms  "
+              f"{row['successes']}/{row['probes']} ok")
+    return 0
+
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='Cloudflare IP Tester')
     
     parser.add_argument('--url', help='VLESS/VMESS/Trojan URL')
     parser.add_argument('--file', help='Input file with IPs/Ranges (e.g. @ips.txt)')
-    parser.add_argument('--range', help='IP Range or CIDR (e.g. 104.16.0.0/24)')
+    parser.add_argument('--range', action='append', help='IP Range or CIDR (e.g. 104.16.0.0/24), can be repeated')
     parser.add_argument('--domain', help='Domain to scan for IPs (e.g. site.com)')
+    parser.add_argument('--domains', help='Many domains to resolve concurrently (@domains.txt or a,b,c)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Start the next batch's Xray while the current batch is probing")
+    parser.add_argument('--probe-backend', choices=ConnectionTester.BACKENDS, default='requests',
+                        help='Probe engine: requests (thread pool) or asyncio (raw SOCKS5, thousands in flight)')
+    parser.add_argument('--mux', action='store_true',
+                        help='One SOCKS inbound per batch, routed by username (allows very large batches)')
+    parser.add_argument('--persistent-xray', action='store_true',
+                        help='Start Xray once and swap batch outbounds through its API (Xray 1.8.12+)')
+    parser.add_argument('--offline-dns', action='store_true',
+                        help='Resolve domains only from the DNS cache in results/ (serves stale answers)')
+    parser.add_argument('--no-dns-cache', action='store_true', help='Do not use the persistent DNS cache')
+    parser.add_argument('--dns-history', metavar='DOMAIN',
+                        help='Show every IP the DNS cache has seen for DOMAIN and exit')
+    parser.add_argument('--stop-after-success', type=int, metavar='N',
+                        help='Stop once N working IPs are found')
+    parser.add_argument('--stop-below-latency', type=float, metavar='MS',
+                        help='Only IPs at or under MS count toward the stop target '
+                             '(N from --stop-after-success, default 20)')
+    parser.add_argument('--budget', type=parse_duration, metavar='TIME',
+                        help='Stop testing after this long, e.g. 90s, 15m, 1h30m')
+    parser.add_argument('--prefilter', choices=Prefilter.MODES, default='off',
+                        help='Drop dead IPs with a direct TCP connect (or TCP + TLS with the SNI) before Xray')
+    parser.add_argument('--prefilter-timeout', type=float, default=1.5, metavar='SEC',
+                        help='Timeout per prefilter connect/handshake (default: 1.5)')
+    parser.add_argument('--prefilter-concurrency', type=int, default=1000, metavar='N',
+                        help='Prefilter checks in flight (default: 1000)')
+    parser.add_argument('--samples', type=int, default=1, metavar='N',
+                        help='Probes per IP over one keep-alive tunnel; latency is their median')
+    parser.add_argument('--warmup', action='store_true',
+                        help='Send one extra probe per IP first and leave it out of the samples')
+    parser.add_argument('--rank-by', choices=Reporter.RANK_KEYS, default='latency',
+                        help='Metric for the top list and working IPs file (min/median/p95/jitter need --samples)')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Continue an interrupted run from its journal in results/runs/')
+    parser.add_argument('--gzip-results', action='store_true',
+                        help='Compress the streamed results file (results_<time>.jsonl.gz)')
+    parser.add_argument('--incremental', type=parse_duration, metavar='TTL',
+                        help='Skip IPs that failed for this server and --bug within TTL (e.g. 6h) '
+                             'and re-test recent working IPs first')
+    parser.add_argument('--priority', action='store_true',
+                        help='Test IPs and /24s with the best history for this server and --bug first')
+    parser.add_argument('--history-window', type=parse_duration, default=7 * 86400, metavar='TIME',
+                        help='History used by --priority (default: 168h)')
+    parser.add_argument('--no-results-db', action='store_true',
+                        help='Do not record probes in results/results.db')
+    parser.add_argument('--best-ips', action='store_true',
+                        help='Show the fastest IPs recorded for --server and --bug (or direct runs) and exit')
+    parser.add_argument('--subnet-latency', action='store_true',
+                        help='Show recorded median latency per /24 for --server (only --bug runs if given) and exit')
+    parser.add_argument('--server', metavar='ADDRESS',
+                        help='Server address for --best-ips / --subnet-latency (default: that of --url)')
+    parser.add_argument('--since', type=parse_duration, default=86400, metavar='TIME',
+                        help='Time window for --best-ips / --subnet-latency (default: 24h)')
+    parser.add_argument('--limit', type=int, default=20, metavar='N',
+                        help='Rows shown by --best-ips / --subnet-latency (default: 20)')
     parser.add_argument('--bug', help='Bug/SNI Domain (e.g. api.ovo.id)')
     parser.add_argument('--quick', action='store_true', help='Run quick test (172.64.0.1-100)')
     parser.add_argument('--line', action='store_true', help='Use LINE/NAVER IP Ranges')
     parser.add_argument('--timeout', type=int, default=10, help='Timeout per IP in seconds')
+    parser.add_argument('--governor', action='store_true',
+                        help='Adapt the batch size (AIMD): grow while stable, halve when timeouts spike')
+    parser.add_argument('--min-concurrent', type=int, default=5, metavar='N',
+                        help='Smallest batch size for --governor (default: 5)')
+    parser.add_argument('--max-concurrent', type=int, metavar='N',
+                        help='Largest batch size for --governor (default: 200; at most --max-threads '
+                             'with the requests backend)')
+    parser.add_argument('--max-threads', type=int, default=50, metavar='N',
+                        help='Probe threads per batch with the requests backend (default: 50)')
+    parser.add_argument('--adaptive-timeout', action='store_true',
+                        help='Derive the probe timeout from observed success latency, capped at --timeout')
+    parser.add_argument('--timeout-quantile', type=float, default=0.99, metavar='Q',
+                        help='Success latency quantile for --adaptive-timeout (default: 0.99)')
+    parser.add_argument('--timeout-factor', type=float, default=3.0, metavar='X',
+                        help='Multiplier on that quantile (default: 3)')
+    parser.add_argument('--min-timeout', type=float, default=1.0, metavar='SEC',
+                        help='Lower bound for --adaptive-timeout (default: 1)')
     parser.add_argument('--concurrent', type=int, default=20, help='Batch size (concurrent requests)')
     parser.add_argument('--auto', action='store_true', help='Auto run without confirmation')
+    parser.add_argument('--order', choices=ScanOrder.ORDERS, default='sequential',
+                        help='Scan order: sequential or seeded pseudo-random over all ranges')
+    parser.add_argument('--seed', type=int, help='Seed for --order random (reproducible runs)')
+    parser.add_argument('--sample', type=int, metavar='K',
+                        help='Test only K random IPs per subnet (stratified sample)')
+    parser.add_argument('--sample-prefix', type=int, default=24, metavar='LEN',
+                        help='Subnet prefix length for --sample (default: 24)')
+    parser.add_argument('--all', action='store_true', help='Use ALL Cloudflare IP ranges')
+    parser.add_argument('--adaptive', type=int, metavar='BUDGET',
+                        help='Adaptive subnet scan: probe --sample K IPs (default 2) per subnet, '
+                             'then spend up to BUDGET probes on the best subnets')
     
     return parser.parse_args()
 
 
+def resume_run(run_id, auto_run=False):
+    """Continue an interrupted run with the settings it was started with"""
+    try:
+        journal = ScanJournal.load(run_id)
+    except ValueError as e:
+        print(f"{Fore.RED}Error: {e}")
+        return 1
+    
+    if journal.finished:
+        print(f"{Fore.YELLOW}Run {run_id} already finished ({journal.tested:,} IPs tested).")
+        return 0
+    
+    config = journal.config
+    config['seed'] = journal.seed
+    config['auto_run'] = auto_run or config.get('auto_run', False)
+    print(f"{Fore.CYAN}Resuming run {run_id}: {journal.tested:,} IPs done")
+    
+    if confirm_and_run(config):
+        return 0 if run_test(config, journal) else 1
+    return 0
+
+
 def main():
     """Main entry point"""
     try:
@@ -434,12 +967,45 @@ def main():
         
         args = parse_arguments()
         
+        # Persistent DNS answers, shared by --domain(s) and interactive mode 3
+        dns_cache = None
+        if not args.no_dns_cache:
+            dns_cache = configure_dns_cache(Path("results") / "dns_cache.db", offline=args.offline_dns)
+        
+        if args.dns_history:
+            return print_dns_history(dns_cache, args.dns_history)
+        
+        if args.best_ips or args.subnet_latency:
+            server = args.server
+            if server is None and args.url:
+                try:
+                    server = URLParser.parse_url(args.url)['address']
+                except Exception as e:
+                    print(f"{Fore.RED}Error parsing URL: {e}")
+                    return 1
+            if server is None:
+                print(f"{Fore.RED}Error: --best-ips / --subnet-latency need --server or --url")
+                return 1
+            
+            results_db = ResultsDB(Path("results") / "results.db")
+            try:
+                if args.best_ips:
+                    return print_best_ips(results_db, server, args.bug, args.since, args.limit)
+                return print_subnet_latency(results_db, server, args.bug, args.since, args.limit)
+            finally:
+                results_db.close()
+        
+        if args.resume:
+            return resume_run(args.resume, args.auto)
+        
         # Check if arguments provided for automation
-        if args.url or args.file or args.range or args.domain or args.quick or args.line:
+        if (args.url or args.file or args.range or args.domain or args.domains
+                or args.quick or args.line or args.all):
             # CLI Mode
             
             # Determine IP Source
             ip_range = None
+            ip_sources = []
             use_cloudflare = False
             use_line = False
             test_domain = None
@@ -449,10 +1015,15 @@ def main():
             elif args.line:
                 use_line = True
                 ip_range = "LINE Ranges" # Placeholder
-            elif args.file:
-                ip_range = args.file if args.file.startswith('@') else f"@{args.file}"
-            elif args.range:
-                ip_range = args.range
+            elif args.all:
+                use_cloudflare = True
+                ip_range = "All Cloudflare ranges"
+            elif args.file or args.range:
+                # --file and repeated --range values are merged and deduplicated
+                if args.file:
+                    ip_sources.append(args.file if args.file.startswith('@') else f"@{args.file}")
+                ip_sources.extend(args.range or [])
+                ip_range = " + ".join(ip_sources)
             elif args.domain:
                 # resolve
                 all_ips, cf_ips = resolve_domain_to_cloudflare_ips(args.domain)
@@ -462,8 +1033,12 @@ def main():
                 elif all_ips:
                     ip_range = ",".join(all_ips)
                     test_domain = args.domain # Warning: non-CF
+            elif args.domains:
+                ip_sources = resolve_domain_list(args.domains)
+                if ip_sources:
+                    ip_range = f"{len(ip_sources)} IPs from {args.domains}"
             
-            if not ip_range and not use_line:
+            if not ip_range and not use_line and not use_cloudflare:
                 print(f"{Fore.RED}Error: No valid IP source provided.")
                 return 1
             
@@ -479,7 +1054,8 @@ def main():
             # Build Config
             config = {
                 'ip_range': ip_range,
-                'use_cloudflare_ranges': False,
+                'ip_sources': ip_sources,
+                'use_cloudflare_ranges': use_cloudflare,
                 'use_line_ranges': use_line,
                 'test_domain': test_domain,
                 'ip_range_display': ip_range,
@@ -495,7 +1071,38 @@ def main():
                 'concurrent': args.concurrent,
                 'top_ips': 20,
                 'estimated_time': "Unknown",
-                'auto_run': args.auto
+                'auto_run': args.auto,
+                'scan_order': args.order,
+                'seed': args.seed,
+                'sample_per_subnet': args.sample,
+                'sample_prefix': args.sample_prefix,
+                'adaptive_budget': args.adaptive,
+                'persistent_xray': args.persistent_xray,
+                'pipeline': args.pipeline,
+                'multiplex': args.mux,
+                'probe_backend': args.probe_backend,
+                'samples': args.samples,
+                'warmup': args.warmup,
+                'rank_by': args.rank_by,
+                'prefilter': args.prefilter,
+                'prefilter_timeout': args.prefilter_timeout,
+                'prefilter_concurrency': args.prefilter_concurrency,
+                'adaptive_timeout': args.adaptive_timeout,
+                'timeout_quantile': args.timeout_quantile,
+                'timeout_factor': args.timeout_factor,
+                'min_timeout': args.min_timeout,
+                'stop_after_success': args.stop_after_success,
+                'stop_below_latency': args.stop_below_latency,
+                'budget': args.budget,
+                'governor': args.governor,
+                'min_concurrent': args.min_concurrent,
+                'max_concurrent': args.max_concurrent,
+                'max_threads': args.max_threads,
+                'compress_results': args.gzip_results,
+                'results_db': not args.no_results_db,
+                'incremental': args.incremental,
+                'priority': args.priority,
+                'history_window': args.history_window
             }
             
             if confirm_and_run(config):
@@ -515,6 +1122,11 @@ def main():
                 print(f"\n{Fore.RED}No valid IP range selected. Exiting.")
                 return 1
             
+            # Full-range modes can be sampled per subnet instead
+            sample_per_subnet, sample_prefix = None, 24
+            if use_cloudflare or use_line:
+                sample_per_subnet, sample_prefix = configure_sampling()
+            
             # Step 2: Configure server
             server_url, server_config = configure_server()
             
@@ -542,7 +1154,12 @@ def main():
                 'concurrent': concurrent,
                 'top_ips': top_ips,
                 'estimated_time': 5 if ip_range and "1-100" in ip_range else "10+",
-                'auto_run': False
+                'auto_run': False,
+                # Spread a full sweep across all prefixes instead of one /24 at a time
+                'scan_order': 'random' if use_cloudflare else 'sequential',
+                'seed': None,
+                'sample_per_subnet': sample_per_subnet,
+                'sample_prefix': sample_prefix
             }
             
             if confirm_and_run(config):
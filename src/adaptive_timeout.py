@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Adaptive Timeout - Probe deadline derived from the observed latency of successes
+"""
+import threading
+from typing import Optional
+
+from latency_stats import P2Quantile
+
+
+class AdaptiveTimeout:
+    """
+    Timeout = quantile(success latency) x factor, clamped to [minimum, maximum]
+
+    Until `warmup` successes have been seen the maximum (the fixed
+    --timeout) is used, so a slow start cannot lock in a deadline that is
+    too tight. Only successful probes are observed; timeouts would bias the
+    estimate toward the deadline itself.
+    """
+
+    def __init__(self, maximum: float, minimum: float = 1.0, quantile: float = 0.99,
+                 factor: float = 3.0, warmup: int = 20):
+        if minimum > maximum:
+            raise ValueError(f"Minimum timeout {minimum}s is above maximum {maximum}s")
+        self.maximum = maximum
+        self.minimum = minimum
+        self.factor = factor
+        self.warmup = warmup
+        self.estimator = P2Quantile(quantile)
+        self._lock = threading.Lock()
+
+    def observe(self, latency_ms: float):
+        with self._lock:
+            self.estimator.add(latency_ms)
+
+    def quantile_ms(self) -> Optional[float]:
+        with self._lock:
+            return self.estimator.value()
+
+    def current(self) -> float:
+        """Timeout in seconds for the next probes"""
+        with self._lock:
+            if self.estimator.count < self.warmup:
+                return self.maximum
+            seconds = self.estimator.value() * self.factor / 1000
+
+        return round(min(self.maximum, max(self.minimum, seconds)), 3)
+
+
+if __name__ == "__main__":
+    # Successes around 150-600ms with a 10s fixed timeout
+    import random
+
+    timeout = AdaptiveTimeout(maximum=10, minimum=1)
+    rng = random.Random(7)
+    for i in range(200):
+        timeout.observe(rng.uniform(150, 600))
+        if i in (0, 18, 19, 199):
+            print(f"after {i + 1} successes: {timeout.current()}s")
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Async Prober - asyncio SOCKS5 + HTTP/1.1 probe engine
+Runs thousands of probes in one thread: raw SOCKS5 CONNECT through the
+local Xray inbound, then a minimal GET to the connectivity-check URL.
+"""
+import asyncio
+import socket
+import struct
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from latency_stats import summarize_samples
+
+
+class ProbeError(Exception):
+    """Probe failed; the message is the result's error string"""
+
+
+class AsyncProber:
+    """
+    Probe engine used by ConnectionTester when backend='asyncio'
+
+    Each endpoint is (ip, proxy_port, username, password); username is
+    None for no-auth inbounds. Every probe round has its own deadline of
+    `timeout` seconds covering the whole exchange.
+    """
+
+    def __init__(self, test_url: str, timeout: float = 5, max_in_flight: int = 2000,
+                 samples: int = 1, warmup: bool = False):
+        url = urlsplit(test_url)
+        if url.scheme != "http":
+            raise ValueError(f"Async prober only supports http:// test URLs: {test_url}")
+
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.samples = max(1, samples)  # Measured probes per IP
+        self.warmup = warmup  # Send one extra, unmeasured probe first
+        self.keep_alive = self.samples > 1 or warmup
+        self.request = (
+            f"GET {self.path} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\n"
+            f"User-Agent: cf-tester\r\n"
+            f"Connection: {'keep-alive' if self.keep_alive else 'close'}\r\n\r\n"
+        ).encode()
+
+    async def _socks5_connect(self, reader, writer, username: Optional[str], password: Optional[str]):
+        """SOCKS5 greeting, optional username/password auth and CONNECT (remote DNS)"""
+        if username is not None:
+            writer.write(b"\x05\x01\x02")
+        else:
+            writer.write(b"\x05\x01\x00")
+        await writer.drain()
+
+        version, method = await reader.readexactly(2)
+        if version != 5 or method == 0xFF:
+            raise ProbeError("Proxy error")
+
+        if method == 2:
+            user = (username or "").encode()
+            pwd = (password or "").encode()
+            writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+            await writer.drain()
+            _, status = await reader.readexactly(2)
+            if status != 0:
+                raise ProbeError("Proxy auth failed")
+
+        host = self.host.encode()
+        writer.write(b"\x05\x01\x00\x03" + bytes([len(host)]) + host + struct.pack(">H", self.port))
+        await writer.drain()
+
+        _, reply, _, atyp = await reader.readexactly(4)
+        if reply != 0:
+            raise ProbeError("Proxy error")
+
+        # Skip bound address
+        if atyp == 1:
+            await reader.readexactly(4 + 2)
+        elif atyp == 3:
+            length = (await reader.readexactly(1))[0]
+            await reader.readexactly(length + 2)
+        elif atyp == 4:
+            await reader.readexactly(16 + 2)
+
+    async def _open(self, proxy_port: int, username: Optional[str], password: Optional[str],
+                    timings: Dict):
+        """
+        Connect to the local inbound and open a SOCKS5 tunnel to the test host
+        Stage durations (ms) are written into `timings`:
+        - proxy_connect_ms: TCP connect to the local Xray inbound
+        - socks_ms: SOCKS5 greeting, auth and CONNECT reply (Xray answers
+          before dialing upstream, so this is local overhead)
+        """
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", proxy_port)
+        except OSError:
+            raise ProbeError("Proxy error")
+        connected = time.perf_counter()
+        timings["proxy_connect_ms"] = round((connected - start) * 1000, 2)
+
+        try:
+            await self._socks5_connect(reader, writer, username, password)
+        except BaseException:
+            writer.close()
+            raise
+        timings["socks_ms"] = round((time.perf_counter() - connected) * 1000, 2)
+        return reader, writer
+
+    async def _request(self, reader, writer, timings: Dict):
+        """
+        Send one GET through an open tunnel and read the whole response
+        Returns (status, reusable). ttfb_ms (request sent -> first response
+        byte) covers the upstream TCP connect to the Cloudflare IP, TLS with
+        the SNI, WebSocket upgrade, VLESS/VMess/Trojan auth and the HTTP
+        round trip when the tunnel is new.
+        """
+        start = time.perf_counter()
+        writer.write(self.request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ProbeError("Connection failed")
+        timings["ttfb_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise ProbeError("Invalid HTTP response")
+        status = int(parts[1])
+
+        # Headers, then the body so the connection can carry the next sample
+        length, reusable = None, self.keep_alive
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection" and value == "close":
+                reusable = False
+            elif name == "transfer-encoding":
+                reusable = False  # Not worth a chunked decoder for a probe
+
+        if status in (204, 304) or length == 0:
+            pass
+        elif length is not None:
+            await reader.readexactly(length)
+        elif reusable:
+            reusable = False
+
+        return status, reusable
+
+    async def _exchange(self, proxy_port: int, username: Optional[str], password: Optional[str],
+                        timings: Dict, tunnel=None):
+        """
+        One probe round: open a tunnel unless `tunnel` is still usable, then
+        request the test URL. Returns (status, tunnel or None if it closed).
+        """
+        try:
+            if tunnel is None:
+                tunnel = await self._open(proxy_port, username, password, timings)
+            status, reusable = await self._request(*tunnel, timings)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self._close(tunnel)
+            raise ProbeError("Connection failed")
+        except BaseException:
+            self._close(tunnel)
+            raise
+
+        if not reusable:
+            self._close(tunnel)
+            tunnel = None
+        return status, tunnel
+
+    @staticmethod
+    def _close(tunnel):
+        if tunnel is not None:
+            tunnel[1].close()
+
+    async def probe(self, ip: str, proxy_port: int, username: Optional[str] = None,
+                    password: Optional[str] = None) -> Dict:
+        """
+        Probe one IP; returns the same result dict as the requests backend
+        With samples > 1 (or warmup) the rounds reuse one keep-alive tunnel,
+        each with its own `timeout`; latency_ms is then the median and the
+        summarize_samples() fields are added. If the first round gets no
+        response, the remaining rounds are skipped, so a dead IP costs one
+        timeout. Stage timings always describe the first round, which pays
+        for the tunnel setup.
+        """
+        result = {
+            "ip": ip,
+            "status": "failed",
+            "latency_ms": None,
+            "proxy_connect_ms": None,
+            "socks_ms": None,
+            "ttfb_ms": None,
+            "total_ms": None,
+            "error": None,
+            "timestamp": time.time()
+        }
+
+        rounds = self.samples + (1 if self.warmup else 0)
+        samples = []
+        tunnel = None
+        answered = False
+
+        for round_index in range(rounds):
+            if round_index and not answered:
+                break
+            timings = result if round_index == 0 else {}
+            start = time.perf_counter()
+            try:
+                status, tunnel = await asyncio.wait_for(
+                    self._exchange(proxy_port, username, password, timings, tunnel), self.timeout)
+            except asyncio.TimeoutError:
+                tunnel = None
+                result["error"] = "Timeout"
+                continue
+            except ProbeError as e:
+                tunnel = None
+                result["error"] = str(e)
+                continue
+            except Exception as e:
+                tunnel = None
+                result["error"] = str(e)
+                continue
+
+            latency = (time.perf_counter() - start) * 1000
+            answered = True
+            if round_index == 0:
+                result["total_ms"] = round(latency, 2)
+
+            if status not in [200, 204]:
+                result["error"] = f"HTTP {status}"
+            elif round_index >= rounds - self.samples:
+                samples.append(latency)
+
+        if tunnel is not None:
+            self._close(tunnel)
+            try:
+                await tunnel[1].wait_closed()
+            except (OSError, ConnectionError):
+                pass
+
+        if rounds > 1:
+            result.update(summarize_samples(samples, self.samples))
+            if samples:
+                result["latency_ms"] = result["median_ms"]
+        elif samples:
+            result["latency_ms"] = round(samples[0], 2)
+
+        if samples:
+            result["status"] = "success"
+            result["error"] = None
+
+        return result
+
+    async def _probe_all(self, endpoints: List[tuple], progress_callback=None) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        results = []
+
+        async def bounded(endpoint):
+            async with semaphore:
+                result = await self.probe(*endpoint)
+            results.append(result)
+            if progress_callback:
+                progress_callback(1, len(endpoints), result)
+
+        await asyncio.gather(*(bounded(endpoint) for endpoint in endpoints))
+        return results
+
+    def probe_many(self, endpoints: List[tuple], progress_callback=None) -> List[Dict]:
+        """Probe all endpoints concurrently; blocks until every probe is done"""
+        if not endpoints:
+            return []
+        return asyncio.run(self._probe_all(endpoints, progress_callback))
+
+
+if __name__ == "__main__":
+    # Probe a port with nothing listening - should fail fast
+    prober = AsyncProber("http://www.gstatic.com/generate_204", timeout=2)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        free_port = sock.getsockname()[1]
+    print(prober.probe_many([("104.16.0.1", free_port, None, None)]))
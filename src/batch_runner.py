@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Batch Runner - Drive batches through Xray, optionally pipelined
+With pipelining, batch N+1's Xray is started on another port block while
+batch N is probing, and finished batches are torn down in the background.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from connection_tester import ConnectionTester
+from port_allocator import PortAllocator
+
+
+class PipelinedBatchRunner:
+    """
+    Run IP batches through ConnectionTester
+
+    depth=1 runs batches strictly one after another (start, probe, stop).
+    depth=2 overlaps: the next batch's config is generated and its Xray is
+    launched before the current batch is probed, and teardown happens on a
+    background thread. Readiness of a batch started ahead is awaited on its
+    own thread from launch, so its startup time excludes the wait for the
+    batch before it; with a PersistentXray that thread also makes the API
+    calls that install the batch. Probe concurrency per batch is unchanged.
+
+    make_config(chunk, base_port) must return the batch Xray config whose
+    SOCKS inbounds start at base_port. Every batch gets its own block of
+    free ports from the PortAllocator, released once its Xray is gone.
+    """
+
+    def __init__(self, tester: ConnectionTester, make_config: Callable[[List[str], int], dict],
+                 port_allocator: PortAllocator = None, depth: int = 2, xray=None,
+                 multiplex: bool = False):
+        self.tester = tester
+        self.multiplex = multiplex  # One inbound per batch instead of one per IP
+        self.make_config = make_config
+        self.depth = max(1, depth)
+        self.xray = xray
+        self.ports = port_allocator or PortAllocator()
+        self._teardown = ThreadPoolExecutor(max_workers=2, thread_name_prefix="xray-teardown")
+        self._readiness = None
+        if self.depth > 1:
+            self._readiness = ThreadPoolExecutor(max_workers=self.depth, thread_name_prefix="xray-ready")
+        self._pending_teardowns = []
+
+    def _start(self, chunk: List[str]) -> dict:
+        block = self.ports.reserve(1 if self.multiplex else len(chunk))
+        try:
+            config = self.make_config(chunk, block.start)
+            batch = self.tester.start_batch(config, chunk, block.start, xray=self.xray)
+        except Exception:
+            block.release()
+            raise
+        batch["port_block"] = block
+        if self._readiness and not batch["error"]:
+            batch["ready"] = self._readiness.submit(self.tester.wait_batch_ready, batch)
+        return batch
+
+    def _stop_and_release(self, batch: dict):
+        try:
+            self.tester.stop_batch(batch)
+        finally:
+            batch["port_block"].release()
+
+    def _stop(self, batch: dict):
+        if self.depth > 1:
+            self._pending_teardowns.append(self._teardown.submit(self._stop_and_release, batch))
+            # Bound the number of Xray processes still shutting down
+            while len(self._pending_teardowns) > 1:
+                self._pending_teardowns.pop(0).result()
+        else:
+            self._stop_and_release(batch)
+
+    def run(self, chunks: Iterable[List[str]], progress_callback=None) -> Iterator[Tuple[List[str], list]]:
+        """Yield (chunk, results) for every batch, in order"""
+        chunks = iter(chunks)
+        in_flight = []
+
+        try:
+            while True:
+                # Keep `depth` batches started ahead of probing
+                while len(in_flight) < self.depth:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    in_flight.append(self._start(chunk))
+
+                if not in_flight:
+                    return
+
+                batch = in_flight.pop(0)
+                try:
+                    if "ready" in batch:
+                        batch["ready"].result()
+                    results = self.tester.probe_started_batch(batch, progress_callback)
+                finally:
+                    self._stop(batch)
+
+                yield batch["ip_list"], results
+        finally:
+            # Stopped early or finished: tear everything down before returning
+            for batch in in_flight:
+                self._stop_and_release(batch)
+            for future in self._pending_teardowns:
+                future.result()
+            self._pending_teardowns = []
+            self._teardown.shutdown(wait=True)
+            if self._readiness:
+                # Waits on torn-down batches end with their process or deadline
+                self._readiness.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Concurrency Governor - AIMD control of the batch size
+Grows the batch (and so the probes in flight) additively while batches
+look healthy and halves it when timeouts spike or the success rate
+collapses, like TCP congestion control.
+"""
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class ConcurrencyGovernor:
+    """
+    Additive-increase / multiplicative-decrease batch size
+
+    After every batch, observe() compares the batch's timeout rate,
+    success rate and median latency with exponentially weighted baselines
+    of earlier batches:
+    - timeout rate above baseline + timeout_spike, or success rate below
+      baseline x (1 - success_drop): size x decrease_factor
+    - median latency above baseline x latency_inflation: hold
+    - otherwise: size + step
+    The size always stays within [minimum, maximum]. Every decision is
+    kept in `decisions` and appended to log_path (JSON lines) if given.
+    """
+
+    def __init__(self, initial: int, minimum: int = 5, maximum: int = 500, step: int = 5,
+                 decrease_factor: float = 0.5, timeout_spike: float = 0.15,
+                 success_drop: float = 0.3, latency_inflation: float = 1.5,
+                 smoothing: float = 0.3, log_path: Optional[Path] = None):
+        if not 1 <= minimum <= maximum:
+            raise ValueError(f"Invalid concurrency bounds: {minimum}-{maximum}")
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = min(maximum, max(minimum, initial))
+        self.step = step
+        self.decrease_factor = decrease_factor
+        self.timeout_spike = timeout_spike
+        self.success_drop = success_drop
+        self.latency_inflation = latency_inflation
+        self.smoothing = smoothing
+        self.log_path = Path(log_path) if log_path else None
+
+        self.decisions: List[Dict] = []
+        self._baseline: Optional[Dict] = None
+
+    def current(self) -> int:
+        """Batch size for the next batch"""
+        return self.size
+
+    @staticmethod
+    def _measure(results: List[Dict]) -> Dict:
+        total = len(results)
+        latencies = [r['latency_ms'] for r in results if r['status'] == 'success']
+        timeouts = sum(1 for r in results if r.get('error') == 'Timeout')
+        return {
+            "success_rate": len(latencies) / total,
+            "timeout_rate": timeouts / total,
+            "median_ms": statistics.median(latencies) if latencies else None
+        }
+
+    def _decide(self, batch: Dict) -> tuple:
+        base = self._baseline
+        if base is None:
+            return "increase", "first batch"
+
+        if batch["timeout_rate"] > base["timeout_rate"] + self.timeout_spike:
+            return "decrease", (f"timeouts {batch['timeout_rate']:.0%} vs "
+                                f"baseline {base['timeout_rate']:.0%}")
+        if batch["success_rate"] < base["success_rate"] * (1 - self.success_drop):
+            return "decrease", (f"success {batch['success_rate']:.0%} vs "
+                                f"baseline {base['success_rate']:.0%}")
+        if (batch["median_ms"] is not None and base["median_ms"] is not None
+                and batch["median_ms"] > base["median_ms"] * self.latency_inflation):
+            return "hold", f"median {batch['median_ms']:.0f}ms vs baseline {base['median_ms']:.0f}ms"
+        return "increase", "stable"
+
+    def _update_baseline(self, batch: Dict):
+        if self._baseline is None:
+            self._baseline = dict(batch)
+            return
+
+        a = self.smoothing
+        for key in ("success_rate", "timeout_rate", "median_ms"):
+            if batch[key] is None:
+                continue
+            if self._baseline[key] is None:
+                self._baseline[key] = batch[key]
+            else:
+                self._baseline[key] = (1 - a) * self._baseline[key] + a * batch[key]
+
+    def observe(self, results: List[Dict]) -> Dict:
+        """Record a finished batch and pick the next batch size"""
+        if not results:
+            return {}
+
+        # Batches that never got an Xray say nothing about the network
+        if all(r['status'] != 'success' and str(r.get('error', '')).startswith('Xray') for r in results):
+            action, reason, batch = "hold", "Xray did not start", None
+        else:
+            batch = self._measure(results)
+            action, reason = self._decide(batch)
+            self._update_baseline(batch)
+
+        previous = self.size
+        if action == "increase":
+            self.size = min(self.maximum, self.size + self.step)
+        elif action == "decrease":
+            self.size = max(self.minimum, int(self.size * self.decrease_factor))
+
+        decision = {
+            "time": time.time(),
+            "batch": len(self.decisions) + 1,
+            "tested": len(results),
+            "size": previous,
+            "next_size": self.size,
+            "action": action,
+            "reason": reason,
+            "success_rate": round(batch["success_rate"], 3) if batch else None,
+            "timeout_rate": round(batch["timeout_rate"], 3) if batch else None,
+            "median_ms": round(batch["median_ms"], 2) if batch and batch["median_ms"] is not None else None
+        }
+        self.decisions.append(decision)
+
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(decision) + "\n")
+
+        return decision
+
+
+if __name__ == "__main__":
+    # Healthy batches, then a timeout storm, then recovery
+    governor = ConcurrencyGovernor(initial=20, maximum=60)
+
+    def batch(size, ok, timeouts):
+        return ([{"status": "success", "latency_ms": 200, "error": None}] * ok
+                + [{"status": "failed", "latency_ms": None, "error": "Timeout"}] * timeouts
+                + [{"status": "failed", "latency_ms": None, "error": "Connection failed"}]
+                * (size - ok - timeouts))
+
+    for ok, timeouts in [(10, 2), (12, 2), (13, 3), (5, 20), (10, 3), (11, 3)]:
+        size = governor.current()
+        decision = governor.observe(batch(size, ok, timeouts))
+        print(f"{decision['size']:3d} -> {decision['next_size']:3d}  {decision['action']:8s} {decision['reason']}")
@@ -3,6 +3,7 @@
 Config Generator - Generate Xray configuration for testing
 """
 import json
+import secrets
 import uuid
 from pathlib import Path
 
@@ -507,10 +508,15 @@ class XrayConfigGenerator:
     def generate_batch_config(self, ip_list: list, server_config: dict, 
                              dns_domain: str = "api.ovo.id", 
                              use_domain_in_address: bool = True,
-                             base_port: int = 20000) -> dict:
+                             base_port: int = 20000,
+                             multiplex: bool = False) -> dict:
         """
         Generate a SINGLE Xray config for testing multiple IPs simultaneously.
         This creates multiple inbounds and outbounds mapped 1:1.
+        
+        With multiplex=True there is only ONE SOCKS inbound (on base_port)
+        with a username per IP ("ip-<index>"); routing rules match the
+        username to pick the outbound, so thousands of IPs share a listener.
         """
         
         # Base config
@@ -540,6 +546,24 @@ class XrayConfigGenerator:
         # Determine protocol
         protocol = server_config['protocol']
         
+        if multiplex:
+            # Single listener, one account per IP
+            password = secrets.token_hex(8)
+            config["inbounds"].append({
+                "listen": "127.0.0.1",
+                "port": base_port,
+                "protocol": "socks",
+                "settings": {
+                    "auth": "password",
+                    "accounts": [
+                        {"user": f"ip-{i}", "pass": password}
+                        for i in range(len(ip_list))
+                    ],
+                    "udp": True
+                },
+                "tag": "socks-mux"
+            })
+        
         # Iterate through IPs and create pairs of Inbound -> Outbound
         for i, ip in enumerate(ip_list):
             port = base_port + i
@@ -547,17 +571,18 @@ class XrayConfigGenerator:
             tag_out = f"proxy-{i}"
             
             # 1. Create Inbound (SOCKS)
-            inbound = {
-                "listen": "127.0.0.1",
-                "port": port,
-                "protocol": "socks",
-                "settings": {
-                    "auth": "noauth",
-                    "udp": True
-                },
-                "tag": tag_in
-            }
-            config["inbounds"].append(inbound)
+            if not multiplex:
+                inbound = {
+                    "listen": "127.0.0.1",
+                    "port": port,
+                    "protocol": "socks",
+                    "settings": {
+                        "auth": "noauth",
+                        "udp": True
+                    },
+                    "tag": tag_in
+                }
+                config["inbounds"].append(inbound)
             
             # 2. Create Outbound (Proxy)
             # Use logic similar to generate_zoom_style_config but adapted for loop
@@ -683,11 +708,22 @@ class XrayConfigGenerator:
             config["outbounds"].append(outbound)
             
             # 3. Create Routing Rule
-            rule = {
-                "type": "field",
-                "inboundTag": [tag_in],
-                "outboundTag": tag_out
-            }
+            if multiplex:
+                # The SOCKS username becomes the session user; usernames repeat
+                # across batches, so the rule is also bound to this batch's
+                # inbound (a persistent Xray prefixes the tag per batch)
+                rule = {
+                    "type": "field",
+                    "inboundTag": ["socks-mux"],
+                    "user": [f"ip-{i}"],
+                    "outboundTag": tag_out
+                }
+            else:
+                rule = {
+                    "type": "field",
+                    "inboundTag": [tag_in],
+                    "outboundTag": tag_out
+                }
             config["routing"]["rules"].append(rule)
             
         return config
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+DNS Cache - Persistent SQLite cache of domain answers with first/last-seen history
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def normalize_domain(domain: str) -> str:
+    """Cache key of a domain: trimmed, lowercase, no trailing dot"""
+    return domain.strip().lower().rstrip('.')
+
+
+class DNSCache:
+    """
+    On-disk cache of A record answers
+
+    Every (domain, ip) pair seen is kept with its TTL and first/last-seen
+    timestamps, so the latest answer can be served without the network and
+    the history shows how a domain's IPs rotate over time.
+    """
+
+    def __init__(self, db_path="results/dns_cache.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                domain TEXT NOT NULL,
+                ip TEXT NOT NULL,
+                ttl INTEGER NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                expires REAL NOT NULL,
+                PRIMARY KEY (domain, ip)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_seen ON answers (domain, last_seen)")
+        self._conn.commit()
+
+    def get(self, domain: str, allow_stale: bool = False) -> Optional[Dict]:
+        """
+        Return the latest answer for domain, or None
+        Returns dict: ips, ttl, expires, stale
+        Expired answers are only returned with allow_stale=True.
+        """
+        domain = normalize_domain(domain)
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT ip, ttl, expires FROM answers
+                WHERE domain = ? AND last_seen = (SELECT MAX(last_seen) FROM answers WHERE domain = ?)
+                ORDER BY ip
+            """, (domain, domain)).fetchall()
+
+        if not rows:
+            return None
+
+        expires = min(row[2] for row in rows)
+        stale = expires <= time.time()
+        if stale and not allow_stale:
+            return None
+
+        return {
+            "ips": [row[0] for row in rows],
+            "ttl": min(row[1] for row in rows),
+            "expires": expires,
+            "stale": stale
+        }
+
+    def put(self, domain: str, ips: List[str], ttl: int):
+        """Record an answer, keeping first_seen of IPs seen before"""
+        domain = normalize_domain(domain)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO answers (domain, ip, ttl, first_seen, last_seen, expires)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (domain, ip) DO UPDATE SET
+                    ttl = excluded.ttl,
+                    last_seen = excluded.last_seen,
+                    expires = excluded.expires
+            """, [(domain, ip, int(ttl), now, now, now + ttl) for ip in ips])
+            self._conn.commit()
+
+    def history(self, domain: str) -> List[Dict]:
+        """Every IP ever seen for domain, oldest first"""
+        domain = normalize_domain(domain)
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT ip, ttl, first_seen, last_seen FROM answers
+                WHERE domain = ? ORDER BY first_seen, ip
+            """, (domain,)).fetchall()
+
+        return [
+            {"ip": ip, "ttl": ttl, "first_seen": first_seen, "last_seen": last_seen}
+            for ip, ttl, first_seen, last_seen in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # Test the cache
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DNSCache(Path(tmp) / "dns.db")
+        cache.put("example.com", ["104.16.1.1", "104.16.2.2"], ttl=1)
+        print(f"Fresh: {cache.get('example.com')}")
+        time.sleep(1.1)
+        print(f"Expired: {cache.get('example.com')}")
+        print(f"Stale allowed: {cache.get('example.com', allow_stale=True)}")
+        cache.put("example.com", ["104.16.3.3"], ttl=300)
+        print(f"History: {[h['ip'] for h in cache.history('example.com')]}")
+        cache.close()
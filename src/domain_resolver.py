@@ -3,26 +3,93 @@
 Domain Resolver - Resolve domain to Cloudflare IPs
 """
 import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import dns.resolver
 
+from cf_classifier import get_classifier
+from dns_cache import DNSCache, normalize_domain
 
-def resolve_domain(domain):
+# TTL used for answers that carry none (system resolver fallback)
+DEFAULT_TTL = 300
+
+
+class TTLCache:
+    """Thread-safe in-memory cache of domain -> IPs honoring record TTLs"""
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, domain):
+        """Return cached IPs, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            self._entries.pop(domain, None)
+            return None
+    
+    def put(self, domain, ips, ttl):
+        with self._lock:
+            self._entries[domain] = (time.monotonic() + ttl, list(ips))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_answer_cache = TTLCache()
+_disk_cache = None
+_offline = False
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def configure_dns_cache(db_path="results/dns_cache.db", offline=False):
     """
-    Resolve domain to IP addresses
-    Returns list of IPs
+    Enable the persistent answer cache for all lookups in this process
+    offline=True never touches the network and serves stale answers.
+    Pass db_path=None to disable the disk cache.
+    """
+    global _disk_cache, _offline
+    _disk_cache = DNSCache(db_path) if db_path else None
+    _offline = offline
+    return _disk_cache
+
+
+def get_dns_cache():
+    """The persistent cache set by configure_dns_cache(), if any"""
+    return _disk_cache
+
+
+def get_resolver(timeout=5):
+    """Shared dnspython resolver, created once (resolve() is thread-safe)"""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = dns.resolver.Resolver()
+        _resolver.timeout = timeout
+        _resolver.lifetime = timeout
+        return _resolver
+
+
+def _lookup(domain, timeout=5):
+    """
+    Resolve A records without the cache
+    Returns tuple: (ips, ttl, source) where source is 'dns' or 'system'
     """
     ips = []
     
     try:
         # Try DNS resolver first
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 5
-        
-        # Get A records
-        answers = resolver.resolve(domain, 'A')
+        answers = get_resolver(timeout).resolve(domain, 'A')
         for rdata in answers:
             ips.append(str(rdata))
+        return ips, answers.rrset.ttl, 'dns'
             
     except Exception:
         # Fallback to socket
@@ -35,28 +102,109 @@ def resolve_domain(domain):
         except Exception:
             pass
     
-    return ips
+    return ips, DEFAULT_TTL, 'system'
 
 
-def is_cloudflare_ip(ip):
+def resolve_domain(domain, timeout=5, use_cache=True):
     """
-    Check if IP belongs to Cloudflare using common ranges
+    Resolve domain to IP addresses
+    Returns list of IPs
     """
-    cloudflare_prefixes = [
-        '173.245.', '103.21.', '103.22.', '103.31.',
-        '141.101.', '108.162.', '190.93.', '188.114.',
-        '197.234.', '198.41.', '162.158.', '104.16.',
-        '104.17.', '104.18.', '104.19.', '104.20.',
-        '104.21.', '104.22.', '104.23.', '104.24.',
-        '104.25.', '104.26.', '104.27.', '104.28.',
-        '104.29.', '104.30.', '104.31.', '172.64.',
-        '172.65.', '172.66.', '172.67.', '131.0.72.', '170.114'
-    ]
+    return resolve_domain_timed(domain, timeout, use_cache)['ips']
+
+
+def resolve_domain_timed(domain, timeout=5, use_cache=True):
+    """
+    Resolve domain and report how the answer was obtained
+    Returns dict: domain, ips, ttl, source, elapsed_ms
+    source: 'cache' (memory), 'disk', 'stale' (expired disk answer),
+            'dns', 'system' (getaddrinfo fallback) or 'offline' (no answer)
+    """
+    start = time.perf_counter()
+    domain = normalize_domain(domain)
+    
+    cached = _answer_cache.get(domain) if use_cache else None
+    stored = None
+    if cached is None and use_cache and _disk_cache:
+        stored = _disk_cache.get(domain, allow_stale=_offline)
+    
+    if cached is not None:
+        ips, ttl, source = cached, None, 'cache'
+    elif stored:
+        ips, ttl = stored['ips'], stored['ttl']
+        source = 'stale' if stored['stale'] else 'disk'
+        if not stored['stale']:
+            # Only what is left of the disk TTL, so memory expires with it
+            ttl = max(0, int(stored['expires'] - time.time()))
+    elif _offline:
+        ips, ttl, source = [], None, 'offline'
+    else:
+        ips, ttl, source = _lookup(domain, timeout)
+        if ips:
+            if _disk_cache:
+                _disk_cache.put(domain, ips, ttl)
+        elif _disk_cache:
+            # Network failed, serve the last known answer if there is one
+            stored = _disk_cache.get(domain, allow_stale=True)
+            if stored:
+                ips, ttl, source = stored['ips'], stored['ttl'], 'stale'
+    
+    # Don't cache failures or stale answers in memory, a retry might succeed
+    if ips and source in ('dns', 'system', 'disk'):
+        _answer_cache.put(domain, ips, ttl)
+    
+    return {
+        "domain": domain,
+        "ips": ips,
+        "ttl": ttl,
+        "source": source,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+
+def resolve_many(domains, max_workers=32, timeout=5, use_cache=True):
+    """
+    Resolve many domains concurrently with a bounded thread pool
+    Returns list of resolve_domain_timed() dicts (input order) with an
+    extra 'cf_ips' key holding the Cloudflare subset of 'ips'
+    """
+    domains = list(dict.fromkeys(normalize_domain(d) for d in domains if d.strip()))
+    if not domains:
+        return []
+    
+    classifier = get_classifier()
     
-    for prefix in cloudflare_prefixes:
-        if ip.startswith(prefix):
-            return True
-    return False
+    def worker(domain):
+        answer = resolve_domain_timed(domain, timeout, use_cache)
+        answer["cf_ips"] = list(classifier.filter_many(answer["ips"]))
+        return answer
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(domains))) as executor:
+        return list(executor.map(worker, domains))
+
+
+def load_domains(spec):
+    """
+    Parse a domain list: '@domains.txt' (one per line, # comments)
+    or a comma-separated string
+    """
+    if spec.startswith('@'):
+        file_path = Path(spec[1:])
+        if not file_path.exists():
+            raise ValueError(f"File not found: {file_path}")
+        with open(file_path, 'r') as f:
+            lines = [line.split('#')[0].strip() for line in f]
+        return [line for line in lines if line]
+    
+    return [d.strip() for d in spec.split(',') if d.strip()]
+
+
+def is_cloudflare_ip(ip):
+    """
+    Check if IP belongs to Cloudflare using the published CIDR ranges
+    (all-cloudflare-ips.txt + IPGenerator.get_cloudflare_ranges())
+    """
+    return get_classifier().contains(ip)
 
 
 def resolve_domain_to_cloudflare_ips(domain):
@@ -65,7 +213,7 @@ def resolve_domain_to_cloudflare_ips(domain):
     Returns tuple: (all_ips, cloudflare_ips)
     """
     all_ips = resolve_domain(domain)
-    cloudflare_ips = [ip for ip in all_ips if is_cloudflare_ip(ip)]
+    cloudflare_ips = list(get_classifier().filter_many(all_ips))
     
     return all_ips, cloudflare_ips
 
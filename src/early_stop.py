@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Early Stop - Stop conditions for a scan (enough good IPs, or out of time)
+"""
+import re
+import time
+from typing import Dict, List, Optional
+
+
+def parse_duration(text: str) -> float:
+    """Parse '90', '90s', '15m', '1h30m' into seconds"""
+    text = str(text).strip().lower()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text)
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)([hms])", text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        raise ValueError(f"Invalid duration: {text} (use e.g. 90s, 15m, 1h30m)")
+
+    units = {"h": 3600, "m": 60, "s": 1}
+    return sum(float(n) * units[u] for n, u in parts)
+
+
+class EarlyStop:
+    """
+    Decides when a scan has found enough
+
+    - success_target: stop after this many working IPs
+    - latency_ms: only IPs at or under this latency count toward the
+      target (default target: default_target, i.e. the top-N size)
+    - budget_s: stop once this much wall-clock time has passed
+
+    The runner checks should_stop() between batches, so the batch in
+    flight always completes and is reported.
+    """
+
+    def __init__(self, success_target: Optional[int] = None, latency_ms: Optional[float] = None,
+                 budget_s: Optional[float] = None, default_target: int = 20):
+        self.latency_ms = latency_ms
+        self.target = success_target or (default_target if latency_ms is not None else None)
+        self.budget_s = budget_s
+        self.found = 0
+        self.started = time.monotonic()
+
+    def record(self, results: List[Dict]):
+        for result in results:
+            if result['status'] != 'success':
+                continue
+            if self.latency_ms is None or result['latency_ms'] <= self.latency_ms:
+                self.found += 1
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def should_stop(self) -> Optional[str]:
+        """Reason to stop now, or None to keep going"""
+        if self.target is not None and self.found >= self.target:
+            if self.latency_ms is not None:
+                return f"found {self.found} IPs under {self.latency_ms:g}ms"
+            return f"found {self.found} working IPs"
+        if self.budget_s is not None and self.elapsed() >= self.budget_s:
+            return f"time budget of {self.budget_s:g}s used up"
+        return None
+
+
+if __name__ == "__main__":
+    # Test the stop conditions
+    print([parse_duration(t) for t in ("90", "90s", "15m", "1h30m")])
+    stop = EarlyStop(success_target=2, latency_ms=200)
+    stop.record([{"status": "success", "latency_ms": 150}, {"status": "success", "latency_ms": 450}])
+    print(f"After one fast IP: {stop.should_stop()}")
+    stop.record([{"status": "success", "latency_ms": 90}])
+    print(f"After two fast IPs: {stop.should_stop()}")
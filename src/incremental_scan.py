@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Incremental Scan - Reuse recent results of the same server and bug host
+IPs that failed within the freshness TTL are skipped, IPs that worked
+are probed again first, everything else is scanned in its usual order.
+"""
+import ipaddress
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ip_set import IPSet
+
+
+class IncrementalScan:
+    """
+    Prior outcomes of a scan target within a freshness window
+
+    The window ends at a fixed `as_of` time saved with the run, so a
+    resumed run rebuilds exactly the same order. iter_ips() yields the
+    recently working IPs (fastest first), then the base order with None
+    in place of every IP already handled; the None entries keep scan
+    positions stable for the journal cursor.
+    """
+
+    def __init__(self, outcomes: Dict[int, tuple], candidates: IPSet):
+        fresh_ok = []
+        failed = []
+        for ip, (status, latency) in outcomes.items():
+            if ip not in candidates:
+                continue
+            if status:
+                fresh_ok.append((latency if latency is not None else float("inf"), ip))
+            else:
+                failed.append(ip)
+
+        fresh_ok.sort()
+        self.fresh_ok: List[str] = [str(ipaddress.IPv4Address(ip)) for _, ip in fresh_ok]
+        # Interval sets: membership is a bisect, and runs of dead addresses
+        # collapse into a few intervals
+        self.failed = IPSet.from_ips(failed)
+        self.skip = self.failed.union(IPSet.from_ips(ip for _, ip in fresh_ok))
+
+    @classmethod
+    def from_db(cls, results_db, candidates: IPSet, server: Optional[str], bug_host: Optional[str],
+                ttl: float, as_of: float) -> "IncrementalScan":
+        return cls(results_db.latest_outcomes(server, bug_host, as_of - ttl, as_of), candidates)
+
+    def total(self, base_count: int) -> int:
+        """IPs that will actually be tested out of a base order of base_count"""
+        return base_count - len(self.skip) + len(self.fresh_ok)
+
+    def iter_ips(self, base: Callable[[int], Iterator[str]], start: int = 0) -> Iterator[Optional[str]]:
+        """
+        Yield the incremental order from position `start`
+        base(position) iterates the normal scan order from that position.
+        """
+        prefix = len(self.fresh_ok)
+        if start < prefix:
+            yield from self.fresh_ok[start:]
+            start = prefix
+
+        skip = self.skip
+        for ip in base(start - prefix):
+            yield None if ip is None or ip in skip else ip
+
+
+if __name__ == "__main__":
+    # Two fresh failures and one fresh success in a /29
+    ip_set = IPSet([(int(ipaddress.IPv4Address("104.16.0.0")), int(ipaddress.IPv4Address("104.16.0.7")))])
+    base_ip = int(ipaddress.IPv4Address("104.16.0.0"))
+    incremental = IncrementalScan({base_ip + 1: (0, None), base_ip + 2: (0, None),
+                                   base_ip + 5: (1, 80.0)}, ip_set)
+
+    def base(start):
+        return (ip_set.ip_at(i) for i in range(start, len(ip_set)))
+
+    print(f"Order: {list(incremental.iter_ips(base))}")
+    print(f"From position 4: {list(incremental.iter_ips(base, 4))}")
+    print(f"To test: {incremental.total(len(ip_set))} of {len(ip_set)}")
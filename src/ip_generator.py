@@ -3,10 +3,13 @@
 IP Generator - Generate IP addresses from various input formats
 """
 import ipaddress
-import re
-from typing import List, Iterator
+import random
+from itertools import islice
+from typing import Callable, List, Iterator, Iterable, Tuple, Union
 from pathlib import Path
 
+from ip_set import IPSet
+
 
 class IPGenerator:
     @staticmethod
@@ -18,83 +21,230 @@ class IPGenerator:
         - Range: 104.16.0.0-104.16.0.255
         - Single IP: 104.16.0.1
         - File: @ips.txt (read from file)
+        
+        Materializes the whole range - prefer iter_range() for large inputs.
+        """
+        return list(IPGenerator.iter_range(ip_range))
+    
+    @staticmethod
+    def iter_range(ip_range: str) -> Iterator[str]:
         """
-        ips = []
+        Lazily yield IPs from a range (same formats as parse_range)
+        Nothing is generated until the caller asks for the next IP,
+        so a /13 costs no more memory than a single address.
+        """
+        ip_range = ip_range.strip()
         
         # Check if it's a file reference
         if ip_range.startswith('@'):
             file_path = Path(ip_range[1:])
-            if file_path.exists():
-                with open(file_path, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#'):
-                            ips.extend(IPGenerator.parse_range(line))
-                return ips
-            else:
+            if not file_path.exists():
                 raise ValueError(f"File not found: {file_path}")
+            
+            with open(file_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        yield from IPGenerator.iter_range(line)
+            return
         
         # CIDR notation
         if '/' in ip_range:
             try:
                 network = ipaddress.ip_network(ip_range, strict=False)
-                return [str(ip) for ip in network.hosts()]
             except Exception as e:
                 raise ValueError(f"Invalid CIDR notation: {ip_range} - {e}")
+            
+            for ip in network.hosts():
+                yield str(ip)
         
         # Range notation (104.16.0.0-104.16.0.255)
         elif '-' in ip_range:
-            try:
-                start_ip, end_ip = ip_range.split('-')
-                start_ip = start_ip.strip()
-                end_ip = end_ip.strip()
-                
-                # If end_ip is just a number, it's last octet
-                if '.' not in end_ip:
-                    # Get first 3 octets from start_ip
-                    base = '.'.join(start_ip.split('.')[:-1])
-                    end_ip = f"{base}.{end_ip}"
-                
-                start = ipaddress.IPv4Address(start_ip)
-                end = ipaddress.IPv4Address(end_ip)
-                
-                if start > end:
-                    raise ValueError("Start IP must be less than or equal to end IP")
-                
-                # Generate IPs in range
-                current = int(start)
-                end_int = int(end)
-                
-                while current <= end_int:
-                    ips.append(str(ipaddress.IPv4Address(current)))
-                    current += 1
-                
-                return ips
-                
-            except Exception as e:
-                raise ValueError(f"Invalid IP range: {ip_range} - {e}")
+            start_int, end_int = IPGenerator._parse_dash_range(ip_range)
+            for current in range(start_int, end_int + 1):
+                yield str(ipaddress.IPv4Address(current))
         
         # Single IP or comma-separated IPs
         else:
-            # Check for comma-separated IPs
-            if ',' in ip_range:
-                result_ips = []
-                for ip in ip_range.split(','):
-                    ip = ip.strip()
-                    if ip:
-                        try:
-                            ipaddress.IPv4Address(ip)
-                            result_ips.append(ip)
-                        except Exception as e:
-                            raise ValueError(f"Invalid IP in list: {ip} - {e}")
-                return result_ips
+            for ip in ip_range.split(','):
+                ip = ip.strip()
+                if not ip:
+                    continue
+                try:
+                    ipaddress.IPv4Address(ip)
+                except Exception as e:
+                    if ',' in ip_range:
+                        raise ValueError(f"Invalid IP in list: {ip} - {e}")
+                    raise ValueError(f"Invalid IP address: {ip_range} - {e}")
+                yield ip
+    
+    @staticmethod
+    def iter_sources(ip_ranges: List[str]) -> Iterator[str]:
+        """Lazily yield IPs from several ranges, one after another"""
+        for ip_range in ip_ranges:
+            yield from IPGenerator.iter_range(ip_range)
+    
+    @staticmethod
+    def iter_intervals(ip_range: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yield inclusive (start, end) integer intervals for a range
+        Same formats and host semantics as iter_range, but a CIDR or
+        range costs one tuple instead of one string per address.
+        """
+        ip_range = ip_range.strip()
+        
+        # Check if it's a file reference
+        if ip_range.startswith('@'):
+            file_path = Path(ip_range[1:])
+            if not file_path.exists():
+                raise ValueError(f"File not found: {file_path}")
             
-            # Single IP
+            with open(file_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        yield from IPGenerator.iter_intervals(line)
+            return
+        
+        # CIDR notation - hosts only, like network.hosts()
+        if '/' in ip_range:
             try:
-                ipaddress.IPv4Address(ip_range)
-                return [ip_range]
+                network = ipaddress.ip_network(ip_range, strict=False)
             except Exception as e:
-                raise ValueError(f"Invalid IP address: {ip_range} - {e}")
+                raise ValueError(f"Invalid CIDR notation: {ip_range} - {e}")
+            
+            first = int(network.network_address)
+            last = int(network.broadcast_address)
+            if network.prefixlen < 31:
+                first, last = first + 1, last - 1
+            yield first, last
+        
+        # Range notation
+        elif '-' in ip_range:
+            yield IPGenerator._parse_dash_range(ip_range)
+        
+        # Single IP or comma-separated IPs
+        else:
+            for ip in IPGenerator.iter_range(ip_range):
+                n = int(ipaddress.IPv4Address(ip))
+                yield n, n
+    
+    @staticmethod
+    def build_ip_set(ip_ranges: List[str]) -> IPSet:
+        """
+        Merge several ranges into one deduplicated IPSet
+        Overlapping CIDRs, ranges and file entries are tested only once.
+        """
+        intervals = []
+        for ip_range in ip_ranges:
+            intervals.extend(IPGenerator.iter_intervals(ip_range))
+        return IPSet(intervals)
+    
+    @staticmethod
+    def subnet_of(ip: str, prefix_len: int = 24) -> str:
+        """Return the /prefix_len subnet containing ip (e.g. 104.16.3.0/24)"""
+        return str(ipaddress.ip_network(f"{ip}/{prefix_len}", strict=False))
+    
+    @staticmethod
+    def iter_subnet_groups(ip_set: IPSet, prefix_len: int) -> Iterator[Tuple[int, List[Tuple[int, int]]]]:
+        """
+        Group the set's addresses by /prefix_len block
+        Yields (block_start, [(start, end), ...]) for every block that
+        contains at least one address of the set, in ascending order.
+        """
+        block_size = 1 << (32 - prefix_len)
+        current_block = None
+        pieces = []
+        
+        for start, end in ip_set.intervals():
+            while start <= end:
+                block = start - (start % block_size)
+                piece_end = min(end, block + block_size - 1)
+                
+                if block != current_block:
+                    if pieces:
+                        yield current_block, pieces
+                    current_block = block
+                    pieces = []
+                pieces.append((start, piece_end))
+                start = piece_end + 1
+        
+        if pieces:
+            yield current_block, pieces
+    
+    @staticmethod
+    def count_subnet_samples(ip_set: IPSet, per_subnet: int = 1, prefix_len: int = 24) -> Tuple[int, int]:
+        """Return (number of subnets, number of samples) for sample_subnets"""
+        subnets = samples = 0
+        for _, pieces in IPGenerator.iter_subnet_groups(ip_set, prefix_len):
+            subnets += 1
+            samples += min(per_subnet, sum(end - start + 1 for start, end in pieces))
+        return subnets, samples
+    
+    @staticmethod
+    def sample_subnets(ip_ranges, per_subnet: int = 1, prefix_len: int = 24,
+                       seed: int = None) -> Iterator[Tuple[str, str]]:
+        """
+        Stratified sample: pick up to `per_subnet` random IPs from every
+        /prefix_len subnet covered by the ranges
+        Accepts a list of range strings or a ready IPSet.
+        Yields (ip, subnet) so each result can be attributed to its subnet.
+        """
+        if not 0 < prefix_len <= 32:
+            raise ValueError(f"Invalid prefix length: {prefix_len}")
+        
+        ip_set = ip_ranges if isinstance(ip_ranges, IPSet) else IPGenerator.build_ip_set(ip_ranges)
+        rng = random.Random(seed)
+        
+        for block, pieces in IPGenerator.iter_subnet_groups(ip_set, prefix_len):
+            subnet = f"{ipaddress.IPv4Address(block)}/{prefix_len}"
+            total = sum(end - start + 1 for start, end in pieces)
+            
+            for offset in sorted(rng.sample(range(total), min(per_subnet, total))):
+                # Map offset within the subnet's addresses back to an IP
+                for start, end in pieces:
+                    size = end - start + 1
+                    if offset < size:
+                        yield str(ipaddress.IPv4Address(start + offset)), subnet
+                        break
+                    offset -= size
+    
+    @staticmethod
+    def iter_chunks(ips: Iterable[str], size: Union[int, Callable[[], int]]) -> Iterator[List[str]]:
+        """
+        Split an IP iterator into lists of at most `size` IPs
+        size may be a callable, read again before every chunk (adaptive batch size).
+        """
+        iterator = iter(ips)
+        while True:
+            chunk = list(islice(iterator, size() if callable(size) else size))
+            if not chunk:
+                return
+            yield chunk
+    
+    @staticmethod
+    def _parse_dash_range(ip_range: str) -> Tuple[int, int]:
+        """Parse '104.16.0.0-104.16.0.255' or '104.16.0.1-100' into integer bounds"""
+        try:
+            start_ip, end_ip = ip_range.split('-')
+            start_ip = start_ip.strip()
+            end_ip = end_ip.strip()
+            
+            # If end_ip is just a number, it's last octet
+            if '.' not in end_ip:
+                # Get first 3 octets from start_ip
+                base = '.'.join(start_ip.split('.')[:-1])
+                end_ip = f"{base}.{end_ip}"
+            
+            start = ipaddress.IPv4Address(start_ip)
+            end = ipaddress.IPv4Address(end_ip)
+            
+            if start > end:
+                raise ValueError("Start IP must be less than or equal to end IP")
+            
+            return int(start), int(end)
+        except Exception as e:
+            raise ValueError(f"Invalid IP range: {ip_range} - {e}")
 
     
     @staticmethod
@@ -108,9 +258,9 @@ class IPGenerator:
     
     @staticmethod
     def count_ips(ip_range: str) -> int:
-        """Count how many IPs will be generated from a range"""
+        """Count how many unique IPs will be generated from a range"""
         try:
-            return len(IPGenerator.parse_range(ip_range))
+            return IPGenerator.build_ip_set([ip_range]).count()
         except:
             return 0
     
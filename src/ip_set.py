@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+IP Set - Compact IPv4 set stored as sorted, merged integer intervals
+"""
+import ipaddress
+import socket
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Iterator, Tuple, Union
+
+
+class IPSet:
+    """
+    Set of IPv4 addresses backed by two parallel array('I') columns holding
+    inclusive [start, end] bounds. Intervals are kept sorted, non-overlapping
+    and non-adjacent, so a /13 costs 8 bytes no matter how many hosts it has.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        self._starts = array('I')
+        self._ends = array('I')
+
+        for start, end in sorted(intervals):
+            if start > end:
+                raise ValueError(f"Invalid interval: {start} > {end}")
+
+            # Merge overlapping or touching intervals
+            if self._ends and start <= self._ends[-1] + 1:
+                if end > self._ends[-1]:
+                    self._ends[-1] = end
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+        self._size = sum(e - s + 1 for s, e in zip(self._starts, self._ends))
+        self._offsets = None
+
+    @staticmethod
+    def _to_int(ip: Union[str, int]) -> int:
+        """
+        Convert dotted IPv4 string (or int) to int
+        inet_pton is as strict as ipaddress (four decimal octets, no
+        leading zeros or whitespace) but runs in C; ValueError otherwise.
+        """
+        if isinstance(ip, int):
+            return ip
+        try:
+            return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+        except (OSError, TypeError):
+            raise ValueError(f"Invalid IPv4 address: {ip!r}") from None
+
+    @classmethod
+    def from_ips(cls, ips: Iterable[Union[str, int]]) -> "IPSet":
+        """Build a set from individual addresses"""
+        return cls((n, n) for n in map(cls._to_int, ips))
+
+    def intervals(self) -> Iterator[Tuple[int, int]]:
+        """Yield inclusive (start, end) integer intervals in ascending order"""
+        return zip(self._starts, self._ends)
+
+    def interval_count(self) -> int:
+        """Number of merged intervals"""
+        return len(self._starts)
+
+    def count(self) -> int:
+        """Exact number of addresses in the set"""
+        return self._size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __contains__(self, ip) -> bool:
+        try:
+            n = self._to_int(ip)
+        except ValueError:
+            return False
+        idx = bisect_right(self._starts, n) - 1
+        return idx >= 0 and n <= self._ends[idx]
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """True if any address in [start, end] is in the set"""
+        idx = bisect_right(self._starts, end) - 1
+        return idx >= 0 and self._ends[idx] >= start
+
+    def __iter__(self) -> Iterator[str]:
+        """Lazily yield every address as a dotted string, in ascending order"""
+        for n in self.iter_ints():
+            yield str(ipaddress.IPv4Address(n))
+
+    def iter_ints(self) -> Iterator[int]:
+        """Lazily yield every address as an int, in ascending order"""
+        for start, end in self.intervals():
+            yield from range(start, end + 1)
+
+    def int_at(self, index: int) -> int:
+        """Return the index-th smallest address as an int, in O(log #intervals)"""
+        if not 0 <= index < self._size:
+            raise IndexError("IPSet index out of range")
+
+        if self._offsets is None:
+            # Running count of addresses before each interval
+            self._offsets = array('Q')
+            total = 0
+            for start, end in self.intervals():
+                self._offsets.append(total)
+                total += end - start + 1
+
+        idx = bisect_right(self._offsets, index) - 1
+        return self._starts[idx] + (index - self._offsets[idx])
+
+    def ip_at(self, index: int) -> str:
+        """Return the index-th smallest address as a dotted string"""
+        return str(ipaddress.IPv4Address(self.int_at(index)))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, IPSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self) -> str:
+        return f"IPSet({self._size} IPs in {len(self._starts)} intervals)"
+
+    def union(self, other: "IPSet") -> "IPSet":
+        """Addresses in either set"""
+        return IPSet(list(self.intervals()) + list(other.intervals()))
+
+    def difference(self, other: "IPSet") -> "IPSet":
+        """Addresses in this set but not in `other`"""
+        result = []
+        others = list(other.intervals())
+        j = 0
+
+        for start, end in self.intervals():
+            # Skip intervals of `other` entirely below this one
+            while j < len(others) and others[j][1] < start:
+                j += 1
+
+            k = j
+            current = start
+            while k < len(others) and others[k][0] <= end:
+                o_start, o_end = others[k]
+                if o_start > current:
+                    result.append((current, o_start - 1))
+                current = max(current, o_end + 1)
+                if current > end:
+                    break
+                k += 1
+
+            if current <= end:
+                result.append((current, end))
+
+        return IPSet(result)
+
+    def intersection(self, other: "IPSet") -> "IPSet":
+        """Addresses present in both sets"""
+        result = []
+        a = list(self.intervals())
+        b = list(other.intervals())
+        i = j = 0
+
+        while i < len(a) and j < len(b):
+            start = max(a[i][0], b[j][0])
+            end = min(a[i][1], b[j][1])
+            if start <= end:
+                result.append((start, end))
+
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+
+        return IPSet(result)
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+
+if __name__ == "__main__":
+    # Test the set
+    a = IPSet([(10, 20), (15, 30), (31, 40), (100, 110)])
+    b = IPSet([(18, 25), (105, 200)])
+    print(f"a = {list(a.intervals())} ({len(a)} IPs)")
+    print(f"b = {list(b.intervals())} ({len(b)} IPs)")
+    print(f"a | b = {list((a | b).intervals())}")
+    print(f"a - b = {list((a - b).intervals())}")
+    print(f"a & b = {list((a & b).intervals())}")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Latency Stats - Summaries of repeated probes of one IP and streaming quantiles
+"""
+import bisect
+import math
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_samples(samples: List[float], sent: int) -> Dict:
+    """
+    Summarize the successful sample latencies (ms, in send order) of an IP
+    Returns dict: min_ms, median_ms, p95_ms, jitter_ms, loss, sent,
+    samples_ms. Jitter is the mean absolute difference between consecutive
+    samples (RFC 3550 style, unsmoothed); loss counts sent probes that got
+    no 200/204 answer. Latency fields are None when every probe was lost.
+    """
+    summary = {
+        "min_ms": None,
+        "median_ms": None,
+        "p95_ms": None,
+        "jitter_ms": None,
+        "loss": sent - len(samples),
+        "sent": sent,
+        "samples_ms": [round(s, 2) for s in samples]
+    }
+
+    if samples:
+        ordered = sorted(samples)
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            median = ordered[middle]
+        else:
+            median = (ordered[middle - 1] + ordered[middle]) / 2
+
+        diffs = [abs(b - a) for a, b in zip(samples, samples[1:])]
+
+        summary["min_ms"] = round(ordered[0], 2)
+        summary["median_ms"] = round(median, 2)
+        summary["p95_ms"] = round(percentile(samples, 95), 2)
+        summary["jitter_ms"] = round(sum(diffs) / len(diffs), 2) if diffs else 0.0
+
+    return summary
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate in O(1) memory (Jain & Chlamtac's P² algorithm)
+
+    Five markers track the minimum, p/2, p, (1+p)/2 and the maximum; each
+    new value shifts marker positions and adjusts their heights with a
+    piecewise-parabolic fit. Exact (nearest-rank) until 5 values are seen.
+    """
+
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"Quantile must be between 0 and 1: {p}")
+        self.p = p
+        self.count = 0
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value: float):
+        self.count += 1
+        q = self._heights
+
+        if self.count <= 5:
+            q.append(value)
+            q.sort()
+            return
+
+        # Cell the value falls in, stretching the extremes if needed
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = bisect.bisect_right(q, value, 1, 4) - 1
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers toward their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self) -> Optional[float]:
+        """Current estimate, or None before the first value"""
+        if not self._heights:
+            return None
+        if self.count <= 5:
+            return percentile(self._heights, self.p * 100)
+        return self._heights[2]
+
+
+if __name__ == "__main__":
+    # Test the summary
+    print(summarize_samples([120.0, 80.5, 82.0, 79.0, 300.0], sent=6))
+    print(summarize_samples([], sent=3))
+
+    import random
+    rng = random.Random(1)
+    values = [rng.lognormvariate(5, 0.5) for _ in range(20000)]
+    estimate = P2Quantile(0.99)
+    for v in values:
+        estimate.add(v)
+    print(f"p99 estimate {estimate.value():.1f}ms, exact {percentile(values, 99):.1f}ms")
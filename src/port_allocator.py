@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Port Allocator - Reserve blocks of free local ports for Xray inbounds
+"""
+import os
+import random
+import socket
+import threading
+from typing import List
+
+
+class PortBlock:
+    """A contiguous run of reserved local ports"""
+
+    def __init__(self, allocator: "PortAllocator", start: int, count: int):
+        self.allocator = allocator
+        self.start = start
+        self.count = count
+
+    @property
+    def ports(self) -> List[int]:
+        return list(range(self.start, self.start + self.count))
+
+    def release(self):
+        self.allocator.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __repr__(self):
+        return f"PortBlock({self.start}-{self.start + self.count - 1})"
+
+
+class PortAllocator:
+    """
+    Hands out contiguous blocks of local ports that are free right now
+
+    Blocks never overlap within this process, and every port of a block is
+    test-bound before it is handed out, so ports held by a leftover Xray or
+    another program are skipped. Searching starts at a random offset so
+    concurrent runs on the same host rarely race for the same block.
+    """
+
+    def __init__(self, low: int = 20000, high: int = 60000, host: str = "127.0.0.1"):
+        if not 0 < low < high <= 65535:
+            raise ValueError(f"Invalid port range: {low}-{high}")
+
+        self.low = low
+        self.high = high
+        self.host = host
+        self._reserved = {}  # start -> count
+        self._lock = threading.Lock()
+        self._cursor = random.randrange(low, high)
+
+    def _is_free(self, port: int) -> bool:
+        """Check that a port can be bound the way Xray binds it"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            if os.name != 'nt':
+                # Like Go's listener: ignore TIME_WAIT leftovers, fail on live listeners
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((self.host, port))
+                return True
+            except OSError:
+                return False
+
+    def _overlaps(self, start: int, count: int) -> bool:
+        return any(start < s + c and s < start + count for s, c in self._reserved.items())
+
+    def reserve(self, count: int) -> PortBlock:
+        """Reserve `count` consecutive free ports; raises RuntimeError if none are left"""
+        if count < 1:
+            raise ValueError("Port count must be at least 1")
+
+        span = self.high - self.low
+        if count > span:
+            raise RuntimeError(f"Cannot fit {count} ports in {self.low}-{self.high}")
+
+        with self._lock:
+            start = self._cursor
+            tried = 0
+
+            while tried < span:
+                if start + count > self.high:
+                    tried += self.high - start
+                    start = self.low
+                    continue
+
+                if self._overlaps(start, count):
+                    start += 1
+                    tried += 1
+                    continue
+
+                busy = next((p for p in range(start, start + count) if not self._is_free(p)), None)
+                if busy is None:
+                    self._reserved[start] = count
+                    self._cursor = start + count
+                    return PortBlock(self, start, count)
+
+                # Restart the search just past the busy port
+                tried += busy - start + 1
+                start = busy + 1
+
+        raise RuntimeError(f"No block of {count} free ports in {self.low}-{self.high}")
+
+    def release(self, block: PortBlock):
+        with self._lock:
+            self._reserved.pop(block.start, None)
+
+    def reserved_count(self) -> int:
+        with self._lock:
+            return sum(self._reserved.values())
+
+
+if __name__ == "__main__":
+    # Test the allocator
+    allocator = PortAllocator()
+    busy = socket.socket()
+    busy.bind(("127.0.0.1", 0))
+    busy.listen()
+    busy_port = busy.getsockname()[1]
+
+    a = allocator.reserve(20)
+    b = allocator.reserve(20)
+    print(f"Reserved {a} and {b}")
+    a.release()
+    print(f"Still reserved: {allocator.reserved_count()} ports")
+
+    # A block starting just before a port that is in use must skip it
+    narrow = PortAllocator(busy_port - 2, busy_port + 10)
+    block = narrow.reserve(5)
+    print(f"Busy port {busy_port} skipped: {busy_port not in block.ports} ({block})")
+    busy.close()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Prefilter - Cheap direct TCP/TLS reachability check before the Xray probe
+Dead IPs (port closed, filtered, or TLS refused for the SNI) are dropped
+with thousands of connects in flight and a short timeout, so only
+survivors get an Xray outbound and a proxied HTTP request.
+"""
+import asyncio
+import os
+import ssl
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+
+class Prefilter:
+    """
+    Async TCP connect (mode='tcp') or TCP + TLS handshake (mode='tls')
+
+    In TLS mode the ClientHello carries `sni`, the same serverName the Xray
+    outbound will use; certificates are not verified, the handshake just
+    has to complete. Survivors keep their direct timings (tcp_ms, tls_ms),
+    which split the upstream leg the proxied probe cannot see.
+    """
+
+    MODES = ("off", "tcp", "tls")
+
+    def __init__(self, port: int = 443, mode: str = "tcp", sni: Optional[str] = None,
+                 timeout: float = 1.5, concurrency: int = 1000):
+        if mode not in ("tcp", "tls"):
+            raise ValueError(f"Unknown prefilter mode: {mode}")
+        if mode == "tls" and not sni:
+            raise ValueError("TLS prefilter needs an SNI")
+
+        self.port = port
+        self.mode = mode
+        self.sni = sni
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.checked = 0
+        self.passed = 0
+        self._timings: Dict[str, Dict] = {}
+
+        self._ssl = None
+        if mode == "tls":
+            self._ssl = ssl.create_default_context()
+            self._ssl.check_hostname = False
+            self._ssl.verify_mode = ssl.CERT_NONE
+
+    async def _check(self, ip: str) -> Dict:
+        """Returns dict: ip, alive, tcp_ms, tls_ms, error"""
+        result = {"ip": ip, "alive": False, "tcp_ms": None, "tls_ms": None, "error": None}
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        transport = None
+
+        try:
+            # Plain connect first so TCP and TLS time separately
+            transport, _ = await asyncio.wait_for(
+                loop.create_connection(asyncio.Protocol, ip, self.port), self.timeout)
+            connected = time.perf_counter()
+            result["tcp_ms"] = round((connected - start) * 1000, 2)
+
+            if self._ssl:
+                protocol = transport.get_protocol()
+                transport = await asyncio.wait_for(
+                    loop.start_tls(transport, protocol, self._ssl, server_hostname=self.sni),
+                    self.timeout)
+                result["tls_ms"] = round((time.perf_counter() - connected) * 1000, 2)
+
+            result["alive"] = True
+        except asyncio.TimeoutError:
+            result["error"] = "TLS timeout" if result["tcp_ms"] is not None else "TCP timeout"
+        except ssl.SSLError as e:
+            result["error"] = f"TLS failed: {e.reason or e}"
+        except OSError as e:
+            stage = "TLS" if result["tcp_ms"] is not None else "TCP"
+            reason = os.strerror(e.errno) if e.errno else (str(e) or "connection closed")
+            result["error"] = f"{stage} failed: {reason}"
+        finally:
+            if transport is not None:
+                transport.abort()
+
+        return result
+
+    async def _check_all(self, ips: List[str]) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(ip):
+            async with semaphore:
+                return await self._check(ip)
+
+        return await asyncio.gather(*(bounded(ip) for ip in ips))
+
+    def check(self, ips: List[str]) -> List[Dict]:
+        """Check a list of IPs concurrently; blocks until all are done"""
+        if not ips:
+            return []
+        checks = asyncio.run(self._check_all(ips))
+        self.checked += len(checks)
+        self.passed += sum(1 for c in checks if c["alive"])
+        return checks
+
+    def pop_timings(self, ip: str) -> Dict:
+        """Direct timings of a survivor, to merge into its probe result"""
+        return self._timings.pop(ip, {})
+
+    def filter_chunks(self, chunks: Iterable[List[str]], batch_size: Union[int, Callable[[], int]],
+                      window: int = None,
+                      on_dead: Callable[[List[Dict]], None] = None) -> Iterator[List[str]]:
+        """
+        Re-chunk a stream of IP chunks into batches of survivors
+
+        Source chunks are gathered into windows of about `window` IPs
+        (default: concurrency) and checked together. Dead IPs are handed to
+        on_dead as failed result dicts; survivors are yielded in batches of
+        batch_size (a callable is read again before every batch). Use a
+        window of one source chunk when the source plans its next chunk
+        from earlier results (adaptive scheduler).
+        """
+        size = batch_size if callable(batch_size) else (lambda: batch_size)
+        single_chunk = window is not None and window <= size()
+        window = window or self.concurrency
+        chunks = iter(chunks)
+        survivors = []
+
+        while True:
+            pending = []
+            for chunk in chunks:
+                pending.extend(chunk)
+                if len(pending) >= window:
+                    break
+
+            if not pending:
+                break
+
+            dead = []
+            for check in self.check(pending):
+                if check["alive"]:
+                    survivors.append(check["ip"])
+                    self._timings[check["ip"]] = {"tcp_ms": check["tcp_ms"], "tls_ms": check["tls_ms"]}
+                else:
+                    dead.append({
+                        "ip": check["ip"],
+                        "status": "failed",
+                        "latency_ms": None,
+                        "error": f"Prefilter: {check['error']}",
+                        "timestamp": time.time()
+                    })
+
+            if dead and on_dead:
+                on_dead(dead)
+
+            while survivors and len(survivors) >= size():
+                count = size()
+                yield survivors[:count]
+                survivors = survivors[count:]
+
+            # An adaptive source must see results before it plans more
+            if single_chunk and survivors:
+                yield survivors
+                survivors = []
+
+        if survivors:
+            yield survivors
+
+
+if __name__ == "__main__":
+    # Check a closed local port and a public resolver
+    prefilter = Prefilter(port=443, mode="tcp", timeout=1)
+    for check in prefilter.check(["127.0.0.1", "1.1.1.1"]):
+        print(check)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Priority Scheduler - Test the IPs most likely to work first, based on history
+IPs and /24 subnets with past results for the same server and bug host are
+scored and popped from a heap; addresses without any history keep their
+usual scan order and go between the better and the worse known ones.
+"""
+import heapq
+import ipaddress
+import statistics
+from typing import Dict, Iterator, Optional
+
+from ip_set import IPSet
+
+
+class HistoryPriorityScheduler:
+    """
+    Heap of scan candidates ordered by expected cost per working IP
+
+    A score is an estimated latency divided by an estimated success rate
+    (lower is better, like SubnetStats.score):
+    - an IP's success rate is smoothed toward its /24's, and its /24's
+      toward the rate over all history
+    - latency is the IP's median, else its /24's, else the overall median
+    - both fade back toward the overall values as the last probe ages,
+      halving the weight of history every `half_life` seconds
+
+    Only IPs and subnets with history go into the heap; an unknown address
+    scores exactly the overall values, so known entries scoring better are
+    popped first, then the base scan order (known addresses replaced by
+    None so positions stay stable), then the remaining heap.
+    """
+
+    SMOOTHING = 2  # Pseudo-probes pulling small samples toward the prior
+
+    def __init__(self, ip_history: Dict[int, tuple], subnet_history: Dict[int, tuple],
+                 now: float, half_life: float = 86400):
+        self.ip_history = ip_history
+        self.subnet_history = subnet_history
+        self.now = now
+        self.half_life = half_life
+
+        probes = sum(h[0] for h in subnet_history.values())
+        successes = sum(h[1] for h in subnet_history.values())
+        medians = [h[2] for h in subnet_history.values() if h[2] is not None]
+        self.prior_rate = (successes + 1) / (probes + 2)
+        self.prior_ms = statistics.median(medians) if medians else 1000.0
+        self.neutral = self.prior_ms / self.prior_rate
+
+    @classmethod
+    def from_db(cls, results_db, server: Optional[str], bug_host: Optional[str],
+                window: float, as_of: float, half_life: float = 86400) -> "HistoryPriorityScheduler":
+        since = as_of - window
+        return cls(results_db.probe_history(server, bug_host, since, as_of, "ip"),
+                   results_db.probe_history(server, bug_host, since, as_of, "subnet"),
+                   now=as_of, half_life=half_life)
+
+    def _estimate(self, history: tuple, base_rate: float, base_ms: float) -> tuple:
+        probes, successes, median_ms, last_seen = history
+        rate = (successes + self.SMOOTHING * base_rate) / (probes + self.SMOOTHING)
+        latency = median_ms if median_ms is not None else base_ms
+
+        # Old results say less about now
+        weight = 0.5 ** (max(0.0, self.now - last_seen) / self.half_life)
+        rate = self.prior_rate + (rate - self.prior_rate) * weight
+        latency = self.prior_ms + (latency - self.prior_ms) * weight
+        return rate, latency
+
+    def subnet_estimate(self, subnet: int) -> tuple:
+        """(success rate, latency ms) expected for an untested IP of a /24"""
+        history = self.subnet_history.get(subnet)
+        if history is None:
+            return self.prior_rate, self.prior_ms
+        return self._estimate(history, self.prior_rate, self.prior_ms)
+
+    def ip_score(self, ip: int) -> float:
+        subnet_rate, subnet_ms = self.subnet_estimate(ip >> 8)
+        history = self.ip_history.get(ip)
+        if history is None:
+            return subnet_ms / subnet_rate
+        rate, latency = self._estimate(history, subnet_rate, subnet_ms)
+        return latency / max(rate, 0.01)
+
+    def subnet_score(self, subnet: int) -> float:
+        rate, latency = self.subnet_estimate(subnet)
+        return latency / max(rate, 0.01)
+
+    def iter_ips(self, candidates: IPSet, base: Iterator[str]) -> Iterator[Optional[str]]:
+        """
+        Yield candidates in priority order
+        `base` is the normal scan order of `candidates`; it is only consumed
+        between the better and the worse half of the heap.
+        """
+        known_ips = {ip for ip in self.ip_history if ip in candidates}
+        heap = [(self.ip_score(ip), 0, ip) for ip in known_ips]
+        known_subnets = []
+        for subnet in self.subnet_history:
+            first = subnet << 8
+            if candidates.overlaps(first, first + 255):
+                heap.append((self.subnet_score(subnet), 1, subnet))
+                known_subnets.append((first, first + 255))
+        heapq.heapify(heap)
+
+        def pop():
+            score, kind, key = heapq.heappop(heap)
+            if kind == 0:
+                yield str(ipaddress.IPv4Address(key))
+                return
+            # Untested-by-history addresses of the subnet
+            for n in range(key << 8, (key << 8) + 256):
+                if n in candidates and n not in known_ips:
+                    yield str(ipaddress.IPv4Address(n))
+
+        while heap and heap[0][0] <= self.neutral:
+            yield from pop()
+
+        # Covered by the heap already
+        handed_out = IPSet(known_subnets).union(IPSet.from_ips(known_ips))
+        for ip in base:
+            yield None if ip is None or ip in handed_out else ip
+
+        while heap:
+            yield from pop()
+
+
+if __name__ == "__main__":
+    # One fast /24, one dead /24, one fast IP in a barely probed /24
+    now = 1_000_000.0
+    fast = int(ipaddress.IPv4Address("104.16.1.0")) >> 8
+    dead = int(ipaddress.IPv4Address("104.16.2.0")) >> 8
+    lone = int(ipaddress.IPv4Address("104.16.3.9"))
+    scheduler = HistoryPriorityScheduler(
+        ip_history={(fast << 8) + 1: (1, 1, 60.0, now), (dead << 8) + 1: (1, 0, None, now),
+                    lone: (2, 2, 80.0, now - 3600)},
+        subnet_history={fast: (10, 9, 90.0, now), dead: (10, 0, None, now),
+                        lone >> 8: (2, 2, 80.0, now - 3600)},
+        now=now
+    )
+
+    candidates = IPSet([(int(ipaddress.IPv4Address("104.16.0.0")), int(ipaddress.IPv4Address("104.16.3.255")))])
+    order = [ip for ip in scheduler.iter_ips(candidates, iter(candidates)) if ip]
+    print(f"First: {order[:3]}")
+    print(f"Last: {order[-2:]}")
+    print(f"Neutral score {scheduler.neutral:.0f}, {len(order)} of {len(candidates)} IPs, "
+          f"{len(set(order))} unique")
@@ -6,14 +6,33 @@ import json
 import csv
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Union
 from colorama import Fore, Style, init
 from tqdm import tqdm
 
+from result_stream import ResultStreamWriter, iter_results
+
 init(autoreset=True)
 
 
 class Reporter:
+    STAGE_LABELS = (
+        ('tcp_ms', 'Direct TCP connect'),
+        ('tls_ms', 'Direct TLS handshake'),
+        ('proxy_connect_ms', 'Local proxy connect'),
+        ('socks_ms', 'Local SOCKS handshake'),
+        ('ttfb_ms', 'First byte (incl. upstream setup)'),
+        ('total_ms', 'Total'),
+    )
+    # --rank-by choice -> result field; single-sample results fall back to latency_ms
+    RANK_KEYS = {
+        'latency': 'latency_ms',
+        'min': 'min_ms',
+        'median': 'median_ms',
+        'p95': 'p95_ms',
+        'jitter': 'jitter_ms',
+    }
+    
     def __init__(self, output_dir: str = "results"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
@@ -70,29 +89,72 @@ class Reporter:
             print(f"  Fastest: {Fore.WHITE}{stats['min_latency_ms']:.2f}ms")
             print(f"  Slowest: {Fore.WHITE}{stats['max_latency_ms']:.2f}ms")
         
+        stages = stats.get('stage_avg_ms')
+        if stages:
+            print(f"\n{Fore.YELLOW}Stage Breakdown (avg of successful):")
+            for stage, label in self.STAGE_LABELS:
+                if stage in stages:
+                    print(f"  {label}: {Fore.WHITE}{stages[stage]:.2f}ms")
+            if 'tcp_ms' not in stages:
+                print(f"  {Fore.CYAN}(direct TCP/TLS timings need --prefilter tcp or tls)")
+        
+        if stats.get('avg_xray_startup_ms'):
+            print(f"\n{Fore.YELLOW}Xray startup (avg per batch): {Fore.WHITE}{stats['avg_xray_startup_ms']:.0f}ms")
+        
         print("="*60 + "\n")
     
-    def print_top_ips(self, results: List[Dict], top_n: int = 10):
-        """Print top N fastest IPs"""
+    @classmethod
+    def rank(cls, results: Iterable[Dict], rank_by: str = 'latency') -> List[Dict]:
+        """Successful results, best first by the chosen metric"""
+        key = cls.RANK_KEYS[rank_by]
         successful = [r for r in results if r['status'] == 'success']
+        return sorted(successful, key=lambda r: (
+            r[key] if r.get(key) is not None else r['latency_ms'], r['latency_ms']))
+    
+    def print_top_ips(self, results: List[Dict], top_n: int = 10, rank_by: str = 'latency'):
+        """Print top N fastest IPs"""
+        sorted_results = self.rank(results, rank_by)
         
-        if not successful:
+        if not sorted_results:
             print(f"{Fore.RED}No successful connections found!")
             return
         
-        sorted_results = sorted(successful, key=lambda x: x['latency_ms'])
         top_results = sorted_results[:top_n]
         
-        print(f"{Fore.CYAN}{Style.BRIGHT}Top {len(top_results)} Fastest IPs:")
+        ranked = "" if rank_by == 'latency' else f" (by {rank_by})"
+        print(f"{Fore.CYAN}{Style.BRIGHT}Top {len(top_results)} Fastest IPs{ranked}:")
         print("-" * 40)
         
         for i, result in enumerate(top_results, 1):
             ip = result['ip']
             latency = result['latency_ms']
-            print(f"{Fore.GREEN}{i:2d}. {ip:15s} - {latency:6.2f}ms")
+            subnet = f"  ({result['subnet']})" if result.get('subnet') else ""
+            samples = self.format_samples(result)
+            samples = f"  {samples}" if samples else ""
+            stages = self.format_stages(result)
+            stages = f"  {Style.DIM}[{stages}]" if stages else ""
+            print(f"{Fore.GREEN}{i:2d}. {ip:15s} - {latency:6.2f}ms{samples}{subnet}{stages}")
         
         print()
     
+    @staticmethod
+    def format_stages(result: Dict) -> str:
+        """Compact per-stage timing, e.g. 'tcp 41.0 / conn 0.3 / socks 1.1 / ttfb 180.2'"""
+        parts = []
+        for stage, short in (('tcp_ms', 'tcp'), ('tls_ms', 'tls'), ('proxy_connect_ms', 'conn'),
+                             ('socks_ms', 'socks'), ('ttfb_ms', 'ttfb')):
+            if result.get(stage) is not None:
+                parts.append(f"{short} {result[stage]:.1f}")
+        return " / ".join(parts)
+    
+    @staticmethod
+    def format_samples(result: Dict) -> str:
+        """Multi-sample summary, e.g. 'min 80.1 p95 95.3 jitter 4.2 loss 0/5'"""
+        if result.get('sent') is None:
+            return ""
+        return (f"min {result['min_ms']:.1f} p95 {result['p95_ms']:.1f} "
+                f"jitter {result['jitter_ms']:.1f} loss {result['loss']}/{result['sent']}")
+    
     def save_json(self, results: List[Dict], filename: str = None) -> str:
         """Save results to JSON file"""
         try:
@@ -133,7 +195,9 @@ class Reporter:
             
             fieldnames = list(keys)
             # Ensure specific order if possible, remove duplicates
-            preferred_order = ['ip', 'status', 'latency_ms', 'error', 'timestamp']
+            preferred_order = ['ip', 'status', 'latency_ms', 'tcp_ms', 'tls_ms', 'proxy_connect_ms', 'socks_ms',
+                               'ttfb_ms', 'total_ms', 'min_ms', 'median_ms', 'p95_ms',
+                               'jitter_ms', 'loss', 'sent', 'error', 'timestamp']
             ordered_fieldnames = []
             
             # Add preferred keys first if they exist
@@ -157,8 +221,34 @@ class Reporter:
             print(f"{Fore.RED}Error saving CSV: {e}")
             return None
     
-    def save_working_ips(self, results: List[Dict], filename: str = None) -> str:
-        """Save only working IPs to text file (one IP per line)"""
+    def open_result_stream(self, run_id: str, compress: bool = False) -> ResultStreamWriter:
+        """
+        Start a results_<run id>.jsonl(.gz) stream, written while testing
+        The file is created exclusively, so runs never share one; a resumed
+        run (whose earlier stream exists) gets results_<run id>_2 and so on.
+        """
+        suffix = ".jsonl.gz" if compress else ".jsonl"
+        session = 1
+        while True:
+            name = f"results_{run_id}{suffix}" if session == 1 else f"results_{run_id}_{session}{suffix}"
+            try:
+                return ResultStreamWriter(self.output_dir / name)
+            except FileExistsError:
+                session += 1
+    
+    @staticmethod
+    def iter_results(results: Union[Iterable[Dict], str, Path]) -> Iterator[Dict]:
+        """Results from a list, or read back from a result stream file"""
+        if isinstance(results, (str, Path)):
+            return iter_results(results)
+        return iter(results)
+    
+    def save_working_ips(self, results: Union[Iterable[Dict], str, Path], filename: str = None,
+                         rank_by: str = 'latency') -> str:
+        """
+        Save only working IPs to text file (one IP per line, best first)
+        results may be a result stream path; only successes are kept in memory.
+        """
         try:
             if not filename:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -166,14 +256,16 @@ class Reporter:
             
             output_path = self.output_dir / filename
             
-            successful = [r for r in results if r['status'] == 'success']
-            sorted_results = sorted(successful, key=lambda x: x['latency_ms'])
+            sorted_results = self.rank(self.iter_results(results), rank_by)
             
             with open(output_path, 'w') as f:
                 for result in sorted_results:
                     ip = result['ip']
                     latency = result['latency_ms']
-                    f.write(f"{ip} # {latency:.2f}ms\n")
+                    samples = self.format_samples(result)
+                    samples = f" ({samples})" if samples else ""
+                    subnet = f" {result['subnet']}" if result.get('subnet') else ""
+                    f.write(f"{ip} # {latency:.2f}ms{samples}{subnet}\n")
             
             print(f"{Fore.GREEN}Working IPs saved to: {Fore.WHITE}{output_path}")
             print(f"{Fore.GREEN}Total working IPs: {Fore.WHITE}{len(sorted_results)}")
@@ -182,9 +274,13 @@ class Reporter:
             print(f"{Fore.RED}Error saving working IPs: {e}")
             return None
     
-    def generate_full_report(self, results: List[Dict], stats: Dict, 
+    def generate_full_report(self, results: Union[Iterable[Dict], str, Path], stats: Dict,
                            config: Dict) -> str:
-        """Generate a comprehensive text report"""
+        """
+        Generate a comprehensive text report
+        results may be a result stream path; it is read twice (successes and
+        subnets first, then failures straight into the report).
+        """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"report_{timestamp}.txt"
         output_path = self.output_dir / filename
@@ -217,22 +313,56 @@ class Reporter:
                 f.write(f"  Fastest: {stats['min_latency_ms']:.2f}ms\n")
                 f.write(f"  Slowest: {stats['max_latency_ms']:.2f}ms\n")
             
+            stages = stats.get('stage_avg_ms')
+            if stages:
+                f.write(f"\nStage Breakdown (avg of successful):\n")
+                for stage, label in self.STAGE_LABELS:
+                    if stage in stages:
+                        f.write(f"  {label}: {stages[stage]:.2f}ms\n")
+            
             f.write("\n" + "="*70 + "\n")
-            f.write("Successful IPs (sorted by latency):\n")
+            rank_by = config.get('rank_by', 'latency')
+            f.write(f"Successful IPs (sorted by {rank_by}):\n")
             f.write("="*70 + "\n\n")
             
-            successful = [r for r in results if r['status'] == 'success']
-            sorted_results = sorted(successful, key=lambda x: x['latency_ms'])
+            # Per-subnet coverage when the scan was a stratified sample
+            subnets = {}
+            successful = []
+            for result in self.iter_results(results):
+                if result['status'] == 'success':
+                    successful.append(result)
+                if result.get('subnet'):
+                    entry = subnets.setdefault(result['subnet'], [0, 0])
+                    entry[0] += 1
+                    if result['status'] == 'success':
+                        entry[1] += 1
+            
+            sorted_results = self.rank(successful, rank_by)
             
             for i, result in enumerate(sorted_results, 1):
-                f.write(f"{i:3d}. {result['ip']:15s} - {result['latency_ms']:7.2f}ms\n")
+                subnet = f"  ({result['subnet']})" if result.get('subnet') else ""
+                samples = self.format_samples(result)
+                samples = f"  {samples}" if samples else ""
+                stages = self.format_stages(result)
+                stages = f"  [{stages}]" if stages else ""
+                f.write(f"{i:3d}. {result['ip']:15s} - {result['latency_ms']:7.2f}ms{samples}{subnet}{stages}\n")
+            
+            if subnets:
+                working = sum(1 for tested, ok in subnets.values() if ok)
+                f.write("\n" + "="*70 + "\n")
+                f.write(f"Subnet Coverage ({working}/{len(subnets)} subnets with working IPs):\n")
+                f.write("="*70 + "\n\n")
+                for subnet, (tested, ok) in sorted(subnets.items(), key=lambda x: -x[1][1]):
+                    if ok:
+                        f.write(f"{subnet:18s} - {ok}/{tested} working\n")
             
             f.write("\n" + "="*70 + "\n")
             f.write("Failed IPs:\n")
             f.write("="*70 + "\n\n")
             
-            failed = [r for r in results if r['status'] == 'failed']
-            for result in failed:
+            for result in self.iter_results(results):
+                if result['status'] != 'failed':
+                    continue
                 error = result.get('error', 'Unknown')
                 f.write(f"{result['ip']:15s} - {error}\n")
         
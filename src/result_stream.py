@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Result Stream - Append-only JSON lines file of probe results, optionally gzipped
+Results go to disk while the scan runs instead of one json.dump at the end,
+and reports are built by reading the stream back.
+"""
+import gzip
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+
+
+def open_stream(path: Path, mode: str):
+    """Open a .jsonl or .jsonl.gz file in text mode"""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def iter_results(path: Union[str, Path]) -> Iterator[Dict]:
+    """
+    Read results back from a stream, one dict per line
+    A torn last line (writer killed mid-write) is skipped.
+    """
+    try:
+        with open_stream(Path(path), "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except EOFError:
+        # Gzip stream cut off after the last complete flush
+        return
+
+
+class ResultStreamWriter:
+    """
+    Buffered writer of compact result records to a new file
+
+    Records are buffered and written once `buffer_size` are pending or
+    `flush_interval` seconds have passed, so a crash loses at most that
+    much. With a .gz path every flush is a gzip sync point, so the file
+    is readable while the scan is still running. The file must not exist
+    yet (FileExistsError), so two writers never interleave in one stream.
+    """
+
+    def __init__(self, path: Union[str, Path], buffer_size: int = 200, flush_interval: float = 2.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.count = 0
+
+        self._file = open_stream(self.path, "x")
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, result: Dict):
+        line = json.dumps(result, separators=(",", ":"), default=str)
+        with self._lock:
+            self._buffer.append(line)
+            self.count += 1
+            if (len(self._buffer) >= self.buffer_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def write_many(self, results: List[Dict]):
+        for result in results:
+            self.write(result)
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+        # For gzip this ends a deflate block (Z_SYNC_FLUSH)
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._flush()
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Write a compressed stream and read it back
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "results.jsonl.gz"
+        with ResultStreamWriter(path, buffer_size=2) as writer:
+            for i in range(5):
+                writer.write({"ip": f"104.16.0.{i}", "status": "success", "latency_ms": 100.0 + i})
+        print(f"{writer.count} written, read back: {[r['ip'] for r in iter_results(path)]}")
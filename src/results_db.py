@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Results DB - SQLite store of every run and probe result for historical queries
+"""
+import ipaddress
+import json
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from latency_stats import P2Quantile
+
+
+def classify_error(error: Optional[str]) -> Optional[str]:
+    """Coarse error class of a result's error string (None for successes)"""
+    if not error:
+        return None
+    text = error.lower()
+    if text.startswith("prefilter"):
+        return "prefilter"
+    if text.startswith("xray"):
+        return "xray"
+    if "timeout" in text or "timed out" in text:
+        return "timeout"
+    if text.startswith("http "):
+        return "http"
+    if "proxy" in text or "socks" in text:
+        return "proxy"
+    if "connection" in text or "reset" in text or "refused" in text:
+        return "connection"
+    return "other"
+
+
+class _Median:
+    """
+    MEDIAN() aggregate for SQLite; NULLs are ignored
+
+    Exact up to EXACT_LIMIT values per group; larger groups (a busy /24
+    over a long window) go on as a P² estimate, so memory per group stays
+    bounded.
+    """
+
+    EXACT_LIMIT = 65536  # About 2 MB of floats
+
+    def __init__(self):
+        self.values = []
+        self.estimator = None
+
+    def step(self, value):
+        if value is None:
+            return
+        if self.estimator is not None:
+            self.estimator.add(value)
+            return
+        self.values.append(value)
+        if len(self.values) > self.EXACT_LIMIT:
+            self.estimator = P2Quantile(0.5)
+            for v in self.values:
+                self.estimator.add(v)
+            self.values = []
+
+    def finalize(self):
+        if self.estimator is not None:
+            return self.estimator.value()
+        return statistics.median(self.values) if self.values else None
+
+
+# Config keys not stored with a run: the server config and URL hold the
+# UUID or password, the display name only repeats the server address
+PRIVATE_PARAMS = ("server_config", "server_url", "server_display")
+
+
+class ResultsDB:
+    """
+    On-disk history of all runs
+
+    runs holds one row per run (server, bug host, SNI, port, parameters);
+    probes holds one row per tested IP, with the IP and its /24 as
+    integers, status (1 = success), latency, error class and timestamp.
+    WAL mode lets queries run while a scan is writing.
+    """
+
+    def __init__(self, db_path="results/results.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_aggregate("MEDIAN", 1, _Median)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                run_id TEXT NOT NULL UNIQUE,
+                started REAL NOT NULL,
+                server TEXT,
+                protocol TEXT,
+                bug_host TEXT,
+                sni TEXT,
+                port INTEGER,
+                params TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_bug_host ON runs (bug_host, started);
+
+            CREATE TABLE IF NOT EXISTS probes (
+                run INTEGER NOT NULL REFERENCES runs (id),
+                ip INTEGER NOT NULL,
+                subnet INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                latency_ms REAL,
+                error_class TEXT,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_probes_ip ON probes (ip, ts);
+            CREATE INDEX IF NOT EXISTS idx_probes_subnet ON probes (subnet, ts);
+            CREATE INDEX IF NOT EXISTS idx_probes_ts ON probes (ts, subnet, status, latency_ms);
+            CREATE INDEX IF NOT EXISTS idx_probes_run ON probes (run, ts, status, latency_ms, ip);
+        """)
+        self._scrub_params()
+        self._conn.commit()
+
+    def _scrub_params(self):
+        """Drop private keys from runs recorded before they were left out"""
+        rows = self._conn.execute(
+            "SELECT id, params FROM runs WHERE params LIKE '%\"server_url\"%' "
+            "OR params LIKE '%\"server_display\"%'").fetchall()
+        for run, params in rows:
+            params = {k: v for k, v in json.loads(params).items() if k not in PRIVATE_PARAMS}
+            self._conn.execute("UPDATE runs SET params = ? WHERE id = ?", (json.dumps(params, default=str), run))
+
+    @staticmethod
+    def run_target(config: Dict) -> tuple:
+        """(server address, bug host) a run's results belong to; None for absent parts"""
+        server = config.get('server_config') or {}
+        bug_host = config.get('dns_domain') if config.get('zoom_style') else None
+        return server.get('address'), bug_host
+
+    def start_run(self, run_id: str, config: Dict) -> int:
+        """Register a run (again, on resume) and return its row id"""
+        server = config.get('server_config') or {}
+        _, bug_host = self.run_target(config)
+        params = {k: v for k, v in config.items() if k not in PRIVATE_PARAMS}
+
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO runs (run_id, started, server, protocol, bug_host, sni, port, params)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id) DO NOTHING
+            """, (run_id, time.time(), server.get('address'), server.get('protocol'), bug_host,
+                  server.get('sni'), server.get('port'), json.dumps(params, default=str)))
+            self._conn.commit()
+            return self._conn.execute("SELECT id FROM runs WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    def add_results(self, run: int, results: List[Dict]):
+        """Insert a batch of probe results in one transaction"""
+        rows = []
+        now = time.time()
+        for r in results:
+            ip = int(ipaddress.IPv4Address(r['ip']))
+            rows.append((
+                run, ip, ip >> 8,
+                1 if r['status'] == 'success' else 0,
+                r.get('latency_ms'),
+                classify_error(r.get('error')),
+                r.get('timestamp') or now
+            ))
+
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO probes (run, ip, subnet, status, latency_ms, error_class, ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self._conn.commit()
+
+    def best_ips(self, server: Optional[str], bug_host: Optional[str], since: float,
+                 limit: int = 20) -> List[Dict]:
+        """
+        IPs with the lowest median success latency for a server and bug host since a time
+        bug_host None means direct (non bug/SNI) runs.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT p.ip, COUNT(*), SUM(p.status), MEDIAN(p.latency_ms), MIN(p.latency_ms), MAX(p.ts)
+                FROM probes p
+                WHERE p.run IN (SELECT id FROM runs WHERE server IS ? AND bug_host IS ?)
+                  AND p.ts >= ?
+                GROUP BY p.ip
+                HAVING SUM(p.status) > 0
+                ORDER BY MEDIAN(p.latency_ms), SUM(p.status) * 1.0 / COUNT(*) DESC
+                LIMIT ?
+            """, (server, bug_host, since, limit)).fetchall()
+
+        return [
+            {"ip": str(ipaddress.IPv4Address(ip)), "probes": probes, "successes": ok,
+             "median_ms": median, "min_ms": fastest, "last_seen": last_seen}
+            for ip, probes, ok, median, fastest, last_seen in rows
+        ]
+
+    def subnet_latency(self, server: Optional[str], since: float, bug_host: Optional[str] = None,
+                       limit: int = 50) -> List[Dict]:
+        """
+        Median success latency and probe counts per /24 for a server since a time
+        With a bug_host only that bug host's runs are counted.
+        """
+        runs = "SELECT id FROM runs WHERE server IS ?"
+        args = [server]
+        if bug_host:
+            runs += " AND bug_host = ?"
+            args.append(bug_host)
+        args.append(since)
+        query = f"""
+            SELECT p.subnet, COUNT(*), SUM(p.status), MEDIAN(p.latency_ms)
+            FROM probes p
+            WHERE p.run IN ({runs}) AND p.ts >= ?
+            GROUP BY p.subnet
+            HAVING SUM(p.status) > 0
+            ORDER BY MEDIAN(p.latency_ms)
+            LIMIT ?
+        """
+        args.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+
+        return [
+            {"subnet": f"{ipaddress.IPv4Address(subnet << 8)}/24", "probes": probes,
+             "successes": ok, "median_ms": median}
+            for subnet, probes, ok, median in rows
+        ]
+
+    def latest_outcomes(self, server: Optional[str], bug_host: Optional[str],
+                        since: float, until: float) -> Dict[int, tuple]:
+        """
+        Latest (status, latency_ms) per IP probed for a server and bug host in [since, until)
+        Batches whose Xray never came up were not probed, so they are left out.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT p.ip, p.status, p.latency_ms
+                FROM probes p
+                WHERE p.run IN (SELECT id FROM runs WHERE server IS ? AND bug_host IS ?)
+                  AND p.ts >= ? AND p.ts < ?
+                  AND (p.error_class IS NULL OR p.error_class != 'xray')
+                ORDER BY p.ts
+            """, (server, bug_host, since, until))
+            # Later probes overwrite earlier ones
+            return {ip: (status, latency) for ip, status, latency in rows}
+
+    def probe_history(self, server: Optional[str], bug_host: Optional[str], since: float,
+                      until: float, group_by: str = "ip") -> Dict[int, tuple]:
+        """
+        (probes, successes, median success latency, last probe time) per IP
+        or per /24 (group_by="subnet") for a server and bug host in [since, until)
+        Results of batches whose Xray never came up are not counted.
+        """
+        if group_by not in ("ip", "subnet"):
+            raise ValueError(f"Unknown grouping: {group_by}")
+
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT p.{group_by}, COUNT(*), SUM(p.status), MEDIAN(p.latency_ms), MAX(p.ts)
+                FROM probes p
+                WHERE p.run IN (SELECT id FROM runs WHERE server IS ? AND bug_host IS ?)
+                  AND p.ts >= ? AND p.ts < ?
+                  AND (p.error_class IS NULL OR p.error_class != 'xray')
+                GROUP BY p.{group_by}
+            """, (server, bug_host, since, until))
+            return {key: tuple(rest) for key, *rest in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # Test the store
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ResultsDB(Path(tmp) / "results.db")
+        run = db.start_run("test", {"zoom_style": True, "dns_domain": "api.ovo.id",
+                                    "server_config": {"address": "s.com", "port": 443}})
+        db.add_results(run, [
+            {"ip": "104.16.0.1", "status": "success", "latency_ms": 120.0, "timestamp": time.time()},
+            {"ip": "104.16.0.2", "status": "success", "latency_ms": 80.0, "timestamp": time.time()},
+            {"ip": "104.16.1.3", "status": "failed", "error": "Timeout", "timestamp": time.time()},
+        ])
+        print(db.best_ips("s.com", "api.ovo.id", since=time.time() - 86400))
+        print(db.subnet_latency("s.com", since=time.time() - 86400))
+        db.close()
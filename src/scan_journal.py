@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Scan Journal - Append-only checkpoint of a scan for --resume
+One JSON line per event in results/runs/<run-id>.jsonl: the run's config
+and exact IP set first, then every finished batch with its results and
+the scan cursor. A killed run loses at most the batches still in flight.
+"""
+import ipaddress
+import json
+import os
+import secrets
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from ip_set import IPSet
+
+
+class ScanJournal:
+    """
+    Checkpoint journal of one run
+
+    track() wraps the scan-order iterator: it numbers every IP it hands
+    out and skips IPs the journal already has results for. The cursor
+    saved with each batch is the lowest position still in flight, so a
+    resumed run restarts there and only skips completed IPs after it.
+
+    A loaded journal keeps only the completed IPs, their count and the
+    successes in memory; iter_results() reads all earlier results back
+    from disk.
+    """
+
+    FSYNC_INTERVAL = 5  # Seconds between forced writes to disk
+
+    def __init__(self, path: Path, run_id: str):
+        self.path = Path(path)
+        self.run_id = run_id
+        self.config: Dict = {}
+        self.ip_sources: Optional[List[str]] = None
+        self.seed: Optional[int] = None
+        self.cursor = 0
+        self.tested = 0  # Results recorded before this session (on resume)
+        self.successes: List[Dict] = []
+        self.finished = False
+
+        self._completed = set()
+        self._pending: Dict[str, int] = {}
+        self._next_position = 0
+        self._tracking = False
+        self._file = None
+        self._last_sync = 0.0
+
+    @staticmethod
+    def new_run_id() -> str:
+        return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(2)}"
+
+    @staticmethod
+    def path_for(run_id: str, directory="results/runs") -> Path:
+        return Path(directory) / f"{run_id}.jsonl"
+
+    @classmethod
+    def create(cls, directory="results/runs") -> "ScanJournal":
+        run_id = cls.new_run_id()
+        path = cls.path_for(run_id, directory)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return cls(path, run_id)
+
+    @classmethod
+    def load(cls, run_id: str, directory="results/runs") -> "ScanJournal":
+        """Read a journal back; a torn last line (killed mid-write) is ignored"""
+        path = cls.path_for(run_id, directory)
+        if not path.exists():
+            raise ValueError(f"No journal for run {run_id} ({path})")
+
+        journal = cls(path, run_id)
+        for event in journal._events():
+            if event["type"] == "start":
+                journal.config = event["config"]
+                journal.ip_sources = event["ip_sources"]
+                journal.seed = event["seed"]
+            elif event["type"] == "batch":
+                for result in event["results"]:
+                    journal._completed.add(result["ip"])
+                    if result["status"] == "success":
+                        journal.successes.append(result)
+                journal.tested += len(event["results"])
+                if event.get("cursor") is not None:
+                    journal.cursor = event["cursor"]
+            elif event["type"] == "end":
+                journal.finished = True
+
+        if journal.ip_sources is None:
+            raise ValueError(f"Journal {path} has no start record")
+        return journal
+
+    def _events(self) -> Iterator[Dict]:
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Stream the results recorded before this session from disk"""
+        if self.tested == 0:
+            return
+        count = 0
+        for event in self._events():
+            if event["type"] != "batch":
+                continue
+            for result in event["results"]:
+                if count == self.tested:
+                    return
+                count += 1
+                yield result
+
+    def _write(self, event: Dict):
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(event, default=str) + "\n")
+        self._file.flush()
+
+        if time.monotonic() - self._last_sync >= self.FSYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._last_sync = time.monotonic()
+
+    def start(self, config: Dict, ip_set: IPSet, seed: Optional[int]):
+        """
+        Write the start record of a new run
+        The IP set is saved as its merged intervals, so domains, files and
+        range lists resolve to exactly the same addresses on resume.
+        """
+        self.config = config
+        self.seed = seed
+        self.ip_sources = [
+            f"{ipaddress.IPv4Address(start)}-{ipaddress.IPv4Address(end)}"
+            for start, end in ip_set.intervals()
+        ]
+        self._write({
+            "type": "start",
+            "run_id": self.run_id,
+            "time": time.time(),
+            "config": config,
+            "ip_sources": self.ip_sources,
+            "seed": seed
+        })
+
+    def track(self, ips: Iterable[Optional[str]], start: int = 0) -> Iterator[str]:
+        """
+        Yield IPs from scan position `start` on, skipping completed ones
+        A None entry holds a position without anything to test.
+        """
+        self._tracking = True
+        self._next_position = start
+        for position, ip in enumerate(ips, start):
+            self._next_position = position + 1
+            if ip is None or ip in self._completed:
+                continue
+            self._pending[ip] = position
+            yield ip
+
+    def record(self, results: List[Dict]):
+        """Append finished results together with the new cursor"""
+        if not results:
+            return
+
+        for result in results:
+            self._pending.pop(result["ip"], None)
+
+        cursor = None
+        if self._tracking:
+            cursor = min(self._pending.values()) if self._pending else self._next_position
+            self.cursor = cursor
+
+        self._write({"type": "batch", "time": time.time(), "cursor": cursor, "results": results})
+
+    def finish(self):
+        """Mark the run complete and close the journal"""
+        self._write({"type": "end", "time": time.time()})
+        self.finished = True
+        self.close()
+
+    def close(self):
+        if self._file:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+if __name__ == "__main__":
+    # Journal a run, "kill" it midway and resume
+    import tempfile
+    from ip_generator import IPGenerator
+    from scan_order import ScanOrder
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ip_set = IPGenerator.build_ip_set(["104.16.0.0/29"])
+        journal = ScanJournal.create(tmp)
+        journal.start({"timeout": 5}, ip_set, seed=None)
+        ips = journal.track(iter(ip_set))
+        batch = [next(ips) for _ in range(3)]
+        journal.record([{"ip": ip, "status": "failed"} for ip in batch])
+        journal.close()
+
+        resumed = ScanJournal.load(journal.run_id, tmp)
+        order = ScanOrder(IPGenerator.build_ip_set(resumed.ip_sources))
+        rest = list(resumed.track(order.iter_ips(resumed.cursor), resumed.cursor))
+        print(f"Done before: {batch}")
+        print(f"Cursor {resumed.cursor}, remaining: {rest}")
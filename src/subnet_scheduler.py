@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Subnet Scheduler - Adaptive exploration of IP ranges by subnet
+Probe a few IPs per subnet first, then spend the remaining budget on the
+subnets that answered fast, dropping subnets where every probe failed.
+"""
+import ipaddress
+import math
+import random
+import statistics
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from ip_generator import IPGenerator
+from ip_set import IPSet
+
+
+class SubnetStats:
+    """Probe outcomes and untested addresses of one subnet"""
+
+    def __init__(self, subnet: str, pieces: list):
+        self.subnet = subnet
+        self.pieces = pieces
+        self.size = sum(end - start + 1 for start, end in pieces)
+        self.tested = set()
+        self.successes = 0
+        self.latencies = []
+
+    @property
+    def failures(self) -> int:
+        return len(self.tested) - self.successes
+
+    @property
+    def remaining(self) -> int:
+        return self.size - len(self.tested)
+
+    def score(self) -> float:
+        """Lower is better: median success latency penalized by failure rate"""
+        if not self.successes:
+            return math.inf
+        success_rate = self.successes / len(self.tested)
+        return statistics.median(self.latencies) / success_rate
+
+    def draw(self, count: int, rng: random.Random) -> List[str]:
+        """
+        Pick up to `count` untested addresses at random
+        They only count as tested once issued (mark_tested).
+        """
+        picked = []
+        chosen = set()
+        count = min(count, self.remaining)
+
+        while len(picked) < count:
+            offset = rng.randrange(self.size)
+            for start, end in self.pieces:
+                size = end - start + 1
+                if offset < size:
+                    n = start + offset
+                    break
+                offset -= size
+
+            if n not in self.tested and n not in chosen:
+                chosen.add(n)
+                picked.append(str(ipaddress.IPv4Address(n)))
+
+        return picked
+
+
+class AdaptiveSubnetScheduler:
+    """
+    Successive-halving scheduler over subnets
+
+    Round 0 probes `explore_per_subnet` IPs in every subnet. Each following
+    round keeps the best `keep_fraction` of subnets that produced at least
+    one success (ranked by SubnetStats.score) and doubles the per-subnet
+    allocation, until the probe budget is spent or no live subnet has
+    untested addresses left. Subnets where every probe failed are abandoned.
+
+    Usage:
+        for batch in scheduler.batches(batch_size):
+            results = test(batch)
+            scheduler.record(results)
+    """
+
+    def __init__(self, ip_set: IPSet, budget: int, prefix_len: int = 24,
+                 explore_per_subnet: int = 2, keep_fraction: float = 0.5,
+                 seed: Optional[int] = None):
+        self.budget = budget
+        self.prefix_len = prefix_len
+        self.explore_per_subnet = explore_per_subnet
+        self.keep_fraction = keep_fraction
+        self.rng = random.Random(seed)
+        self.issued = 0
+        self.round = 0
+
+        self.subnets: Dict[str, SubnetStats] = {}
+        for block, pieces in IPGenerator.iter_subnet_groups(ip_set, prefix_len):
+            subnet = f"{ipaddress.IPv4Address(block)}/{prefix_len}"
+            self.subnets[subnet] = SubnetStats(subnet, pieces)
+
+        self._survivors = list(self.subnets.values())
+
+    def total(self) -> int:
+        """Upper bound on the number of probes this scheduler will issue"""
+        return min(self.budget, sum(s.size for s in self.subnets.values()))
+
+    def subnet_of(self, ip: str) -> str:
+        return IPGenerator.subnet_of(ip, self.prefix_len)
+
+    def mark_tested(self, ips: List[str]):
+        """Count IPs as tested in their subnets"""
+        for ip in ips:
+            stats = self.subnets.get(self.subnet_of(ip))
+            if stats:
+                stats.tested.add(int(ipaddress.IPv4Address(ip)))
+
+    def record(self, results: List[Dict]):
+        """Feed back probe results so the next round can be planned"""
+        for result in results:
+            stats = self.subnets.get(self.subnet_of(result['ip']))
+            if stats and result['status'] == 'success' and result.get('latency_ms') is not None:
+                stats.successes += 1
+                stats.latencies.append(result['latency_ms'])
+
+    def restore(self, results: Iterable[Dict]):
+        """
+        Take over results of an interrupted run (--resume)
+        Their IPs count as tested and against the budget; planning restarts
+        at round 0, which now only draws IPs that were not tested yet.
+        `results` is consumed once, so it can stream from the journal.
+        """
+        for result in results:
+            self.mark_tested([result['ip']])
+            self.record([result])
+            self.issued += 1
+
+    def _plan_round(self) -> List[str]:
+        """Pick the IPs for the next round"""
+        if self.round == 0:
+            candidates = self._survivors
+            per_subnet = self.explore_per_subnet
+        else:
+            alive = [s for s in self._survivors if s.successes]
+            alive.sort(key=SubnetStats.score)
+            keep = max(1, math.ceil(len(alive) * self.keep_fraction)) if self.round > 1 else len(alive)
+            candidates = alive[:keep]
+            per_subnet = self.explore_per_subnet * (2 ** self.round)
+
+        candidates = [s for s in candidates if s.remaining]
+        self._survivors = candidates
+        self.round += 1
+
+        ips = []
+        for stats in candidates:
+            ips.extend(stats.draw(per_subnet, self.rng))
+
+        # Interleave subnets so each batch spreads across prefixes
+        self.rng.shuffle(ips)
+        return ips
+
+    def batches(self, batch_size: Union[int, Callable[[], int]]) -> Iterator[List[str]]:
+        """
+        Yield batches of IPs; call record() with each batch's results
+        batch_size may be a callable, read again before every batch.
+        """
+        while self.issued < self.budget:
+            round_ips = self._plan_round()
+            if not round_ips:
+                return
+
+            # Best subnets were already chosen; trim the round to the budget
+            round_ips = round_ips[:self.budget - self.issued]
+            while round_ips:
+                size = batch_size() if callable(batch_size) else batch_size
+                batch, round_ips = round_ips[:size], round_ips[size:]
+                self.mark_tested(batch)
+                self.issued += len(batch)
+                yield batch
+
+    def summary(self) -> List[SubnetStats]:
+        """Subnets with successes, best first"""
+        live = [s for s in self.subnets.values() if s.successes]
+        return sorted(live, key=SubnetStats.score)
+
+
+if __name__ == "__main__":
+    # Simulate: only 104.16.5.0/24 works
+    ip_set = IPGenerator.build_ip_set(["104.16.0.0/20"])
+    scheduler = AdaptiveSubnetScheduler(ip_set, budget=400, seed=1)
+
+    for batch in scheduler.batches(20):
+        scheduler.record([
+            {"ip": ip, "status": "success" if ip.startswith("104.16.5.") else "failed",
+             "latency_ms": 100.0}
+            for ip in batch
+        ])
+
+    best = scheduler.summary()[0]
+    print(f"Probes issued: {scheduler.issued}, rounds: {scheduler.round}")
+    print(f"Best subnet: {best.subnet} ({best.successes}/{len(best.tested)} working)")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Xray API - Long-lived Xray process reconfigured at runtime through its API
+Inbounds, outbounds and routing rules for each batch are added and removed
+via HandlerService/RoutingService, so the process is started once per run.
+"""
+import itertools
+import json
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from colorama import Fore
+
+CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
+
+
+class XrayAPIError(Exception):
+    """Raised when Xray or one of its API calls fails"""
+
+
+def wait_for_ports(ports, timeout: float, process: subprocess.Popen = None,
+                   host: str = "127.0.0.1") -> bool:
+    """
+    Poll local TCP ports until all accept connections
+    Returns False on deadline, or as soon as `process` exits.
+    """
+    deadline = time.monotonic() + timeout
+    pending = list(ports)
+
+    while pending:
+        if process is not None and process.poll() is not None:
+            return False
+
+        port = pending[0]
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                pending.pop(0)
+                continue
+        except OSError:
+            pass
+
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+
+    return True
+
+
+class XrayAPI:
+    """
+    Thin client for a running Xray API endpoint
+    Uses the `xray api` sub-commands (Xray-core 1.8.12+), which speak the
+    gRPC HandlerService/RoutingService protocol. Each call is a short-lived
+    `xray api` process, but the alternative is worse: AddInbound and
+    AddOutbound take protobuf handler configs, and only Xray's own config
+    loader builds those from JSON, so a Python gRPC client would have to
+    reimplement it for every protocol and transport.
+    """
+
+    def __init__(self, xray_path: str, api_port: int, timeout: float = 10):
+        self.xray_path = xray_path
+        self.server = f"127.0.0.1:{api_port}"
+        self.timeout = timeout
+        self.calls = 0
+
+    def _call(self, command: str, args: List[str] = None, payload: Dict = None):
+        # Flags must precede positional arguments (Go flag parsing)
+        cmd = [self.xray_path, "api", command, f"--server={self.server}"] + list(args or [])
+        config_file = None
+        self.calls += 1
+
+        if payload is not None:
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+                json.dump(payload, f)
+                config_file = f.name
+            cmd.append(config_file)
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    timeout=self.timeout, creationflags=CREATION_FLAGS)
+        except subprocess.TimeoutExpired:
+            raise XrayAPIError(f"xray api {command} timed out")
+        finally:
+            if config_file:
+                try:
+                    Path(config_file).unlink()
+                except OSError:
+                    pass
+
+        if result.returncode != 0:
+            raise XrayAPIError(f"xray api {command} failed: {(result.stderr or result.stdout).strip()}")
+
+    def add_inbounds(self, inbounds: List[Dict]):
+        if inbounds:
+            self._call("adi", payload={"inbounds": inbounds})
+
+    def add_outbounds(self, outbounds: List[Dict]):
+        if outbounds:
+            self._call("ado", payload={"outbounds": outbounds})
+
+    def add_rules(self, rules: List[Dict]):
+        if rules:
+            self._call("adrules", args=["-append"], payload={"routing": {"rules": rules}})
+
+    def remove_inbounds(self, tags: List[str]):
+        if tags:
+            self._call("rmi", args=list(tags))
+
+    def remove_outbounds(self, tags: List[str]):
+        if tags:
+            self._call("rmo", args=list(tags))
+
+    def remove_rules(self, rule_tags: List[str]):
+        if rule_tags:
+            self._call("rmrules", args=list(rule_tags))
+
+
+class PersistentXray:
+    """
+    One Xray process kept alive for a whole run
+
+    apply_batch() installs a batch config made by
+    XrayConfigGenerator.generate_batch_config() and returns a handle;
+    remove_batch(handle) takes it out again. Batches get unique tag
+    prefixes, so several can be installed at the same time.
+
+    Installing takes three API calls. Removing takes one: the inbounds go
+    at once (their ports are reused), while the rules and outbounds, which
+    only match their own batch's tags, are purged every PURGE_EVERY
+    batches. The wall time per batch is kept in install_ms and remove_ms.
+    """
+
+    PURGE_EVERY = 8
+
+    def __init__(self, xray_path: str, api_port: int = 10085):
+        self.xray_path = xray_path
+        self.api_port = api_port
+        self.api = XrayAPI(xray_path, api_port)
+        self.process = None
+        self._config_file = None
+        self._batch_ids = itertools.count()
+        self.install_ms: List[float] = []
+        self.remove_ms: List[float] = []
+        self._stale = []  # Handles whose rules and outbounds are still installed
+        self._stale_lock = threading.Lock()
+
+    def base_config(self) -> Dict:
+        """Minimal config exposing only the API inbound"""
+        return {
+            "log": {"loglevel": "error"},
+            "api": {
+                "tag": "api",
+                "services": ["HandlerService", "RoutingService"]
+            },
+            "inbounds": [{
+                "listen": "127.0.0.1",
+                "port": self.api_port,
+                "protocol": "dokodemo-door",
+                "settings": {"address": "127.0.0.1"},
+                "tag": "api"
+            }],
+            "outbounds": [{
+                "protocol": "freedom",
+                "tag": "direct",
+                "settings": {}
+            }],
+            "routing": {
+                "domainStrategy": "AsIs",
+                "rules": [{
+                    "type": "field",
+                    "inboundTag": ["api"],
+                    "outboundTag": "api",
+                    "ruleTag": "api"
+                }]
+            }
+        }
+
+    def start(self, timeout: float = 10) -> float:
+        """Start Xray and wait for the API port; returns startup time in ms"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump(self.base_config(), f)
+            self._config_file = f.name
+
+        start_time = time.perf_counter()
+        self.process = subprocess.Popen(
+            [self.xray_path, "run", "-c", self._config_file],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            creationflags=CREATION_FLAGS
+        )
+
+        if not wait_for_ports([self.api_port], timeout, self.process):
+            stderr = ""
+            if self.process.poll() is not None:
+                stderr = self.process.stderr.read().decode(errors='replace').strip()
+            self.stop()
+            raise XrayAPIError(f"Xray API did not come up on port {self.api_port}: {stderr}")
+
+        return (time.perf_counter() - start_time) * 1000
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def apply_batch(self, config: Dict) -> Dict:
+        """
+        Install the inbounds, outbounds and rules of a batch config
+        The API cannot edit the global dns.hosts table, so outbound
+        addresses mapped there are replaced by the mapped IP directly;
+        SNI and Host still come from streamSettings, so the traffic on the
+        wire is the same.
+        """
+        prefix = f"b{next(self._batch_ids)}-"
+        hosts = config.get("dns", {}).get("hosts", {})
+
+        inbounds = []
+        for inbound in config.get("inbounds", []):
+            inbound = dict(inbound, tag=prefix + inbound["tag"])
+            inbounds.append(inbound)
+
+        outbounds = []
+        for outbound in config.get("outbounds", []):
+            if outbound.get("tag") == "direct":
+                continue
+            outbound = json.loads(json.dumps(outbound))
+            outbound["tag"] = prefix + outbound["tag"]
+            for server in outbound["settings"].get("vnext", []) + outbound["settings"].get("servers", []):
+                if server["address"] in hosts:
+                    server["address"] = hosts[server["address"]][0]
+            outbounds.append(outbound)
+
+        rules = []
+        for i, rule in enumerate(config.get("routing", {}).get("rules", [])):
+            rule = dict(rule)
+            if "inboundTag" in rule:
+                rule["inboundTag"] = [prefix + tag for tag in rule["inboundTag"]]
+            if rule.get("outboundTag") and rule["outboundTag"] != "direct":
+                rule["outboundTag"] = prefix + rule["outboundTag"]
+            rule["ruleTag"] = f"{prefix}rule-{i}"
+            rules.append(rule)
+
+        handle = {
+            "inbounds": [inbound["tag"] for inbound in inbounds],
+            "outbounds": [outbound["tag"] for outbound in outbounds],
+            "rules": [rule["ruleTag"] for rule in rules]
+        }
+
+        # Outbounds and rules first, so no inbound is ever live without a route
+        start_time = time.perf_counter()
+        try:
+            self.api.add_outbounds(outbounds)
+            self.api.add_rules(rules)
+            self.api.add_inbounds(inbounds)
+        except XrayAPIError:
+            self.remove_batch(handle)
+            raise
+
+        self.install_ms.append((time.perf_counter() - start_time) * 1000)
+        return handle
+
+    def remove_batch(self, handle: Dict):
+        """Remove what apply_batch() installed (best effort; rules and outbounds deferred)"""
+        start_time = time.perf_counter()
+        try:
+            self.api.remove_inbounds(handle["inbounds"])
+        except XrayAPIError as e:
+            print(f"{Fore.YELLOW}Warning: {e}")
+
+        with self._stale_lock:
+            self._stale.append(handle)
+            purge = self._stale if len(self._stale) >= self.PURGE_EVERY else []
+            if purge:
+                self._stale = []
+        self._purge(purge)
+        self.remove_ms.append((time.perf_counter() - start_time) * 1000)
+
+    def _purge(self, handles: List[Dict]):
+        """Remove the rules and outbounds of removed batches in one call each"""
+        for remove, key in ((self.api.remove_rules, "rules"),
+                            (self.api.remove_outbounds, "outbounds")):
+            try:
+                remove([tag for handle in handles for tag in handle[key]])
+            except XrayAPIError as e:
+                print(f"{Fore.YELLOW}Warning: {e}")
+
+    def stop(self):
+        """Terminate the Xray process and remove its config file"""
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+        if self._config_file:
+            try:
+                Path(self._config_file).unlink()
+            except OSError:
+                pass
+            self._config_file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -10,6 +10,8 @@ import requests
 from pathlib import Path
 from colorama import Fore, Style, init
 
+from xray_api import PersistentXray
+
 init(autoreset=True)
 
 class XrayManager:
@@ -124,6 +126,16 @@ class XrayManager:
         """Get the path to Xray executable"""
         return str(self.xray_path.absolute())
     
+    def start_persistent(self, api_port=10085):
+        """
+        Start one long-lived Xray process that batches are added to via its API
+        Returns a running PersistentXray (call stop() when done)
+        """
+        xray = PersistentXray(self.get_xray_path(), api_port=api_port)
+        startup_ms = xray.start()
+        print(f"{Fore.GREEN}✓ Persistent Xray started in {startup_ms:.0f}ms (API port {api_port})")
+        return xray
+    
     def get_version(self):
         """Get Xray version"""
         try: